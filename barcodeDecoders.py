@@ -0,0 +1,390 @@
+'''
+decoding for the barcode reader
+each crop goes through a decoder chain: plain zbar first, then cleaned up
+versions of the crop, then another backend if one is installed, stopping
+at the first read. crops from one frame get fanned out over a persistent
+worker pool so a pallet face with 20 labels takes about as long as the
+slowest few, not all of them back to back
+'''
+
+import os, threading, time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from pyzbar.pyzbar import decode as zbar_decode
+
+def zbar_values(gray):
+    #every distinct string zbar finds in one grayscale crop, in order
+    vals = []
+    for r in zbar_decode(gray):
+        try:
+            v = r.data.decode("utf-8", errors="ignore")
+            if v not in vals:
+                vals.append(v)
+        except:
+            pass
+    return vals
+
+# ===================== backends =====================
+class ZbarBackend:
+    name = "zbar"
+
+    def decode(self, gray):
+        return zbar_values(gray)
+
+class ZxingBackend:
+    #zxing-cpp, optional, better on damaged code128 than zbar
+    name = "zxing"
+
+    def __init__(self):
+        import zxingcpp
+        self._zx = zxingcpp
+
+    def decode(self, gray):
+        vals = []
+        for r in self._zx.read_barcodes(np.ascontiguousarray(gray)):
+            if r.text and r.text not in vals:
+                vals.append(r.text)
+        return vals
+
+def load_backend(name):
+    #None when the backend isnt installed on this box
+    try:
+        if name == "zbar":
+            return ZbarBackend()
+        if name == "zxing":
+            return ZxingBackend()
+    except Exception:
+        return None
+    raise ValueError(f"unknown decoder backend {name}")
+
+# ===================== crop clean up =====================
+def binarize(gray):
+    #otsu threshold, helps with faded thermal labels and glare
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return gray
+    levels = np.arange(256)
+    w0 = np.cumsum(hist)
+    w1 = total - w0
+    m0 = np.cumsum(hist * levels)
+    mean0 = m0 / np.maximum(w0, 1)
+    mean1 = (m0[-1] - m0) / np.maximum(w1, 1)
+    between = w0 * w1 * (mean0 - mean1) ** 2
+    t = int(np.argmax(between))
+    return np.where(gray > t, 255, 0).astype(np.uint8)
+
+def sharpen(gray):
+    #3x3 laplacian sharpen for slightly out of focus crops
+    g = gray.astype(np.int16)
+    out = g * 5
+    out[1:, :] -= g[:-1, :]
+    out[:-1, :] -= g[1:, :]
+    out[:, 1:] -= g[:, :-1]
+    out[:, :-1] -= g[:, 1:]
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+def upscale(gray, factor=2):
+    #tiny labels far from the camera, zbar wants a few pixels per bar
+    return np.repeat(np.repeat(gray, factor, axis=0), factor, axis=1)
+
+def rotations(gray, angles=(-12, 12)):
+    #small tilts zbar misses, 90 degree turns it already handles itself
+    from PIL import Image
+    img = Image.fromarray(np.ascontiguousarray(gray))
+    for a in angles:
+        yield np.asarray(img.rotate(a, resample=Image.BILINEAR, expand=True, fillcolor=255))
+
+# ===================== deskew =====================
+def estimate_skew(gray):
+    #angle (degrees) and coherence of the bar direction from the structure
+    #tensor, folded into -45..45 since zbar reads both axes anyway.
+    #coherence near 1 means one strong stripe direction, ie a barcode
+    #middle of the crop only, the box edges and background add fake gradients
+    h, w = gray.shape[:2]
+    g = gray[h // 5:h - h // 5, w // 5:w - w // 5].astype(np.float32)
+    if g.shape[0] < 3 or g.shape[1] < 3:
+        return 0.0, 0.0
+
+    #scharr, plain differences lean towards the axes on thin bars
+    dx = g[:, 2:] - g[:, :-2]
+    dy = g[2:, :] - g[:-2, :]
+    gx = 3 * dx[:-2] + 10 * dx[1:-1] + 3 * dx[2:]
+    gy = 3 * dy[:, :-2] + 10 * dy[:, 1:-1] + 3 * dy[:, 2:]
+    jxx = float((gx * gx).sum())
+    jyy = float((gy * gy).sum())
+    jxy = float((gx * gy).sum())
+    energy = jxx + jyy
+    if energy <= 0:
+        return 0.0, 0.0
+    coherence = np.hypot(jxx - jyy, 2 * jxy) / energy
+    theta = 0.5 * np.degrees(np.arctan2(2 * jxy, jxx - jyy))
+    skew = (theta + 45.0) % 90.0 - 45.0
+    return skew, coherence
+
+def rectify(gray, min_angle=4.0, min_coherence=0.3):
+    #rotate the crop so the bars line up with an axis, returns (crop, angle)
+    #small or unsure angles leave the crop alone
+    if gray.shape[0] < 8 or gray.shape[1] < 8:
+        return gray, 0.0
+    skew, coherence = estimate_skew(gray)
+    if abs(skew) < min_angle or coherence < min_coherence:
+        return gray, 0.0
+    from PIL import Image
+    img = Image.fromarray(np.ascontiguousarray(gray))
+    #image y points down so a positive gradient angle is a clockwise tilt,
+    #pil rotates counter clockwise for positive angles
+    out = img.rotate(skew, resample=Image.BILINEAR, expand=True, fillcolor=255)
+    return np.asarray(out), skew
+
+# ===================== decoder chain =====================
+#ladder step -> (crop variants, backend), variants is a function that
+#yields one or more versions of the crop to try
+LADDER = {
+    "zbar": (lambda g: (g,), "zbar"),
+    "binarize": (lambda g: (binarize(g),), "zbar"),
+    "sharpen": (lambda g: (sharpen(g),), "zbar"),
+    "upscale": (lambda g: (upscale(g),), "zbar"),
+    "rotate": (rotations, "zbar"),
+    "zxing": (lambda g: (g,), "zxing"),
+}
+
+#rough per step budgets in ms, a step is skipped when its measured cost
+#for a crop this size would blow past it. None = always run
+DEFAULT_BUDGETS = {"zbar": None, "binarize": 8, "sharpen": 8, "upscale": 20, "rotate": 30, "zxing": 30}
+
+class DecodeStep:
+    #counters get bumped from every crop pool thread, _lock keeps them whole
+    def __init__(self, name, variants, backend, budget_ms=None):
+        self.name = name
+        self.variants = variants
+        self.backend = backend
+        self.budget_ms = budget_ms
+        self.tries = 0
+        self.hits = 0
+        self.skipped = 0
+        self.total_ms = 0.0
+        self._ms_per_px = None  #running average cost per crop pixel
+        self._lock = threading.Lock()
+
+    def expected_ms(self, gray):
+        per_px = self._ms_per_px
+        if per_px is None:
+            return 0.0
+        return per_px * gray.size
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def run(self, gray):
+        t0 = time.perf_counter()
+        vals = []
+        for g in self.variants(gray):
+            vals = self.backend.decode(g)
+            if vals:
+                break
+        ms = (time.perf_counter() - t0) * 1000
+        per_px = ms / max(1, gray.size)
+        with self._lock:
+            self._ms_per_px = per_px if self._ms_per_px is None else 0.8 * self._ms_per_px + 0.2 * per_px
+            self.tries += 1
+            self.total_ms += ms
+            if vals:
+                self.hits += 1
+        return vals
+
+    def snapshot(self):
+        with self._lock:
+            avg = self.total_ms / self.tries if self.tries else 0.0
+            return {"tries": self.tries, "hits": self.hits, "skipped": self.skipped, "avg_ms": round(avg, 2)}
+
+class DecoderChain:
+    #tries each step in order and stops at the first one that reads anything
+    #the first step always runs so the common case never pays for the rest
+    #the budgets only skip by prediction: a later step is left out when its
+    #average cost so far says it would go over budget_ms or total_ms, a step
+    #that already started is never stopped, so one slow crop can still run over
+    #with rectify on, skewed crops get straightened before any step sees them
+    def __init__(self, steps, total_ms=None, rectify=False, min_angle=4.0):
+        self.steps = steps
+        self.total_ms = total_ms
+        self.rectify = rectify
+        self.min_angle = min_angle
+        self.rectified = 0
+        self.on_crop = None  #fn(secs, values) after every crop, for metrics/tracing
+        self._lock = threading.Lock()
+
+    def decode(self, gray):
+        t0 = time.perf_counter()
+        vals = self._decode(gray, t0)
+        if self.on_crop is not None:
+            self.on_crop(time.perf_counter() - t0, vals)
+        return vals
+
+    def _decode(self, gray, t0):
+        if self.rectify:
+            gray, angle = rectify(gray, self.min_angle)
+            if angle:
+                with self._lock:
+                    self.rectified += 1
+
+        for i, step in enumerate(self.steps):
+            if i > 0:
+                spent = (time.perf_counter() - t0) * 1000
+                guess = step.expected_ms(gray)
+                over_step = step.budget_ms is not None and guess > step.budget_ms
+                over_total = self.total_ms is not None and spent + guess > self.total_ms
+                if over_step or over_total:
+                    step.skip()
+                    continue
+            vals = step.run(gray)
+            if vals:
+                return vals
+        return []
+
+    def snapshot(self):
+        out = {s.name: s.snapshot() for s in self.steps}
+        with self._lock:
+            out["rectified"] = self.rectified
+        return out
+
+def build_chain(spec=("zbar",), budgets=None, total_ms=None, rectify=False, min_angle=4.0):
+    #spec is a list of ladder step names, steps whose backend isnt
+    #installed are left out so the same config works everywhere
+    budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+    backends = {}
+    steps = []
+    for name in spec:
+        variants, backend_name = LADDER[name]
+        if backend_name not in backends:
+            backends[backend_name] = load_backend(backend_name)
+        backend = backends[backend_name]
+        if backend is None:
+            continue
+        steps.append(DecodeStep(name, variants, backend, budgets.get(name)))
+    return DecoderChain(steps, total_ms, rectify, min_angle)
+
+# ===================== process workers =====================
+#segments this worker already has mapped, kept small since the parent
+#swaps arenas out when a frame needs more room than it had
+_attached = {}
+_chain = None
+
+def _init_worker(spec, budgets, total_ms, rectify, min_angle):
+    global _chain
+    _chain = build_chain(spec, budgets, total_ms, rectify, min_angle)
+
+def _decode_chunk(shm_name, jobs):
+    shm = _attached.get(shm_name)
+    if shm is None:
+        if len(_attached) >= 8:
+            _attached.pop(next(iter(_attached))).close()
+        shm = SharedMemory(name=shm_name)
+        _attached[shm_name] = shm
+
+    out = []
+    for offset, h, w in jobs:
+        gray = np.ndarray((h, w), dtype=np.uint8, buffer=shm.buf, offset=offset)
+        out.append(_chain.decode(gray))
+    return out
+
+class _Arena:
+    #one shared memory block the crops of a frame get copied into
+    def __init__(self, size):
+        self.size = size
+        self.shm = SharedMemory(create=True, size=size)
+
+    def destroy(self):
+        self.shm.close()
+        self.shm.unlink()
+
+# ===================== crop pool =====================
+class CropDecodePool:
+    #mode "thread": zbar goes through ctypes which drops the gil, so plain
+    #threads already use every core. mode "process": crops go through shared
+    #memory to worker processes, for when python side work starts to matter.
+    #mode None decodes inline like before
+    #chain is a ladder spec for build_chain, each worker process builds its own
+    def __init__(self, mode="thread", workers=None, inline_below=2,
+                 chain=("zbar",), budgets=None, total_ms=None, rectify=False, min_angle=4.0):
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 2
+        self.inline_below = inline_below  #tiny batches arent worth the handoff
+        self.chain = build_chain(chain, budgets, total_ms, rectify, min_angle)
+        self._exec = None
+        self._arenas = []
+        self._lock = threading.Lock()
+
+        if mode == "thread":
+            self._exec = ThreadPoolExecutor(self.workers, thread_name_prefix="zbar")
+        elif mode == "process":
+            #step stats from worker processes stay in the workers
+            self._exec = ProcessPoolExecutor(
+                self.workers, mp_context=get_context("spawn"),
+                initializer=_init_worker, initargs=(tuple(chain), budgets, total_ms, rectify, min_angle),
+            )
+
+    def decode_all(self, crops):
+        #list of grayscale crops in, list of value lists out in the same order
+        if not crops:
+            return []
+        if self._exec is None or len(crops) < self.inline_below:
+            return [self.chain.decode(c) for c in crops]
+        if self.mode == "thread":
+            return list(self._exec.map(self.chain.decode, crops))
+        return self._decode_shared(crops)
+
+    def _decode_shared(self, crops):
+        crops = [np.ascontiguousarray(c, dtype=np.uint8) for c in crops]
+        need = sum(c.nbytes for c in crops)
+        arena = self._take_arena(need)
+        try:
+            jobs = []
+            offset = 0
+            for c in crops:
+                h, w = c.shape[:2]
+                view = np.ndarray((h, w), dtype=np.uint8, buffer=arena.shm.buf, offset=offset)
+                view[:] = c
+                jobs.append((offset, h, w))
+                offset += c.nbytes
+
+            #one chunk per worker keeps the ipc round trips down
+            per = -(-len(jobs) // self.workers)
+            futs = [
+                self._exec.submit(_decode_chunk, arena.shm.name, jobs[i:i + per])
+                for i in range(0, len(jobs), per)
+            ]
+            out = []
+            for f in futs:
+                out.extend(f.result())
+            return out
+        finally:
+            self._give_arena(arena)
+
+    def _take_arena(self, need):
+        with self._lock:
+            for i, a in enumerate(self._arenas):
+                if a.size >= need:
+                    return self._arenas.pop(i)
+        #round up so a slightly bigger frame next time still fits
+        return _Arena(max(1 << 20, 1 << (need - 1).bit_length()))
+
+    def _give_arena(self, arena):
+        with self._lock:
+            self._arenas.append(arena)
+            if len(self._arenas) > 4:
+                self._arenas.sort(key=lambda a: a.size)
+                self._arenas.pop(0).destroy()
+
+    def shutdown(self):
+        if self._exec is not None:
+            self._exec.shutdown(wait=True)
+            self._exec = None
+        with self._lock:
+            for a in self._arenas:
+                a.destroy()
+            self._arenas = []
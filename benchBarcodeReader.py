@@ -0,0 +1,190 @@
+'''
+throughput bench for the barcode reader
+replays recordings through the same capture -> yolo -> zbar path the app
+uses (barcodeReader.run, just no window) and writes one json result per
+run so runs can be compared
+
+    python benchBarcodeReader.py --source file:clip.mp4 --manifest barcodes.txt
+    python benchBarcodeReader.py --source dir:frames/ --manifest barcodes.txt --set detect_every=3 --out run.json
+    python benchBarcodeReader.py ... --compare base.json
+    python benchBarcodeReader.py ... --trace run-trace.json     spans for ui.perfetto.dev
+
+by default replays go as fast as the pipeline takes them and nothing gets
+dropped, --realtime plays at the recorded frame rate like a camera would
+from python: run_bench([FrameSource(my_arrays)], codes)
+'''
+
+import sys, json, time, argparse, threading
+
+from manifestIndex import ManifestIndex, iter_manifest
+from scanPipeline import percentile
+from scanMetrics import Metrics
+from scanTrace import TraceRecorder
+
+class ReadLog:
+    #stands in for the event store, keeps the first read of every code
+    def __init__(self):
+        self.first = {}
+        self.reads = 0
+        self.off_manifest = set()
+        self._lock = threading.Lock()
+
+    def record(self, order_id, value, code=None, new=False, camera=None, box=None, ts=None, frame=None):
+        with self._lock:
+            self.reads += 1
+            if code is None:
+                self.off_manifest.add(value)
+            elif new and code not in self.first:
+                self.first[code] = {"frame": frame, "camera": camera, "t": time.monotonic()}
+
+def _spread(vals):
+    vals = sorted(v for v in vals if v is not None)
+    if not vals:
+        return None
+    return {
+        "p50": round(percentile(vals, 50), 3),
+        "p90": round(percentile(vals, 90), 3),
+        "max": round(vals[-1], 3),
+        "mean": round(sum(vals) / len(vals), 3),
+    }
+
+def run_bench(sources, manifest, realtime=False, lossless=True, timeout=300.0, overrides=None, trace=None):
+    #sources: spec strings and/or FrameSources, manifest: file path or codes
+    #trace: path for a chrome trace json of the whole run
+    from PyQt5.QtCore import Qt
+    from jetsonBarcodeReaderv003 import barcodeReader, MANIFEST_RULES
+
+    index = ManifestIndex(**MANIFEST_RULES)
+    if isinstance(manifest, str):
+        for code, meta in iter_manifest(manifest):
+            index.add(code, meta)
+    else:
+        for code in manifest:
+            index.add(code)
+
+    reader = barcodeReader(index)
+    reader.cameras = sources
+    reader.realtime = realtime
+    reader.lossless = lossless
+    reader.stop_at_eos = True
+    for k, v in (overrides or {}).items():
+        if not hasattr(reader, k):
+            raise AttributeError(f"barcodeReader has no setting {k}")
+        setattr(reader, k, v)
+
+    reads = ReadLog()
+    reader.store = reads
+    reader.metrics = Metrics()
+    if trace:
+        reader.trace = TraceRecorder(size=500000, slow_ms=0)
+    lines = []
+    reader.log.connect(lambda msg: lines.extend(msg.split("\n")), Qt.DirectConnection)
+
+    #run() on this thread, signals are emitted from it too so nothing needs an event loop
+    timed_out = threading.Event()
+
+    def give_up():
+        timed_out.set()
+        reader.stop()
+
+    watchdog = threading.Timer(timeout, give_up)
+    watchdog.daemon = True
+    watchdog.start()
+    t0 = time.monotonic()
+    reader.run()
+    t_end = time.monotonic()
+    watchdog.cancel()
+    if trace:
+        reader.trace.dump(trace, reason="bench")
+
+    errors = [l for l in lines if "fail" in l or "stage error" in l]
+    if reader.started_at is None:
+        return {"ok": False, "errors": errors}
+
+    scan_s = t_end - reader.started_at
+    stages = reader.stage_stats()
+    captured = reader._capture.frames() if reader._capture is not None else 0
+    first = reads.first
+    return {
+        "ok": True,
+        "sources": [s if isinstance(s, str) else getattr(s, "spec", "array") for s in
+                    (sources.split(",") if isinstance(sources, str) else sources)],
+        "manifest": manifest if isinstance(manifest, str) else f"{len(index)} codes",
+        "realtime": realtime,
+        "lossless": lossless,
+        "settings": overrides or {},
+        "codes": len(index),
+        "found": index.found_count(),
+        "complete": index.complete(),
+        "timed_out": timed_out.is_set(),
+        "startup_s": round(reader.started_at - t0, 3),
+        "scan_s": round(scan_s, 3),
+        "time_to_complete_s": round(reader.completed_at - reader.started_at, 3) if reader.completed_at else None,
+        "frames": captured,
+        "fps": round(captured / scan_s, 2) if scan_s > 0 else 0.0,
+        "frames_to_first_read": _spread([f["frame"] for f in first.values()]),
+        "secs_to_first_read": _spread([f["t"] - reader.started_at for f in first.values()]),
+        "first_read": {c: {"frame": f["frame"], "camera": f["camera"], "s": round(f["t"] - reader.started_at, 3)}
+                       for c, f in first.items()},
+        "missing": index.remaining()[:50],
+        "reads": reads.reads,
+        "off_manifest": sorted(reads.off_manifest)[:50],
+        "stages": stages,
+        "metrics": reader.metrics.snapshot(),
+        "errors": errors[:20],
+    }
+
+def compare(base, run):
+    #short text diff of the numbers that matter between two results
+    out = []
+    for key in ("fps", "scan_s", "time_to_complete_s", "found"):
+        a, b = base.get(key), run.get(key)
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+            pct = f" ({(b - a) / a * 100:+.1f}%)" if a else ""
+            out.append(f"{key:<20}{a:>10}{b:>10}{pct}")
+    for name, st in sorted(run.get("stages", {}).items()):
+        old = base.get("stages", {}).get(name, {})
+        if "p50_ms" in st and "p50_ms" in old:
+            out.append(f"{name + ' p50_ms':<20}{old['p50_ms']:>10}{st['p50_ms']:>10}")
+    return "\n".join(out)
+
+def _setting(text):
+    key, _, val = text.partition("=")
+    try:
+        return key, json.loads(val)
+    except ValueError:
+        return key, val
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="replay recordings through the barcode reader and time it")
+    ap.add_argument("--source", action="append", required=True, help="file:PATH, dir:PATH or any camera spec, repeat for more cameras")
+    ap.add_argument("--manifest", required=True)
+    ap.add_argument("--realtime", action="store_true", help="play at the recorded frame rate")
+    ap.add_argument("--lossy", action="store_true", help="let queues drop frames like the live app")
+    ap.add_argument("--fps", type=int, default=5, help="frame rate for dir: sources with --realtime")
+    ap.add_argument("--timeout", type=float, default=300)
+    ap.add_argument("--set", action="append", default=[], type=_setting, help="barcodeReader setting, eg detect_every=3")
+    ap.add_argument("--out", help="write the json here instead of stdout")
+    ap.add_argument("--compare", help="earlier result json to diff against")
+    ap.add_argument("--trace", help="also write a chrome trace json (perfetto) of the run here")
+    args = ap.parse_args(argv)
+
+    overrides = dict(args.set)
+    #cam_fps also sets the caps of live/test cameras, leave those at the reader default
+    if all(s.startswith(("dir:", "file:")) for s in args.source):
+        overrides.setdefault("cam_fps", args.fps)
+    result = run_bench(",".join(args.source), args.manifest, args.realtime, not args.lossy, args.timeout, overrides, args.trace)
+
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), result), file=sys.stderr)
+    return 0 if result.get("ok") else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
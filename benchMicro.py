@@ -0,0 +1,244 @@
+'''
+micro benchmarks for the hot paths, no camera, gpu or model needed
+frames come from syntheticPallets so the numbers repeat on any linux box:
+crop + grayscale + zbar, manifest lookups at 10k+ codes, turning an
+appsink buffer into a frame and the scan screen list at 10k+ codes (needs
+pyqt5, runs offscreen)
+
+    python benchMicro.py                     everything
+    python benchMicro.py crop decode         just these groups
+    python benchMicro.py --codes 50000 --json micro.json
+    python benchMicro.py list --codes 20000
+'''
+
+import os, sys, json, time, random, argparse, tempfile
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from syntheticPallets import PalletScene, sscc_codes
+
+GROUPS = ("crop", "decode", "manifest", "convert", "list")
+
+def timeit(fn, min_time=0.2, repeat=5):
+    #us per call, loop count picked so one repeat takes about min_time/repeat
+    n = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        took = time.perf_counter() - t0
+        if took >= min_time / repeat / 4 or n >= 1 << 20:
+            break
+        n *= 4
+    n = max(1, int(n * (min_time / repeat) / max(took, 1e-9)))
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        runs.append((time.perf_counter() - t0) / n * 1e6)
+    runs.sort()
+    return {"us": round(runs[len(runs) // 2], 2), "us_min": round(runs[0], 2), "calls": n * repeat}
+
+def _scene(args):
+    scene = PalletScene(args.width, args.height, module=args.module, skew=args.skew,
+                        blur=args.blur, noise=args.noise, seed=args.seed)
+    return scene.render(sscc_codes(args.labels, seed=args.seed))
+
+# ===================== cases =====================
+def crop_cases(frame, truth):
+    from PIL import Image, ImageOps
+    from scanPipeline import gray_crop, pad_boxes
+    h, w = frame.shape[:2]
+    boxes = pad_boxes(np.array([t["box"] for t in truth]), 0.05, 4, w, h)
+
+    def pil():
+        #what the first reader did: rgb pil image, then crop + grayscale per box
+        img = Image.fromarray(frame[:, :, ::-1], mode="RGB")
+        return [ImageOps.grayscale(img.crop(tuple(b))) for b in boxes]
+
+    def numpy_luma():
+        return [gray_crop(frame, b) for b in boxes]
+
+    yield f"pil rgb + crop + grayscale ({len(boxes)} boxes)", pil
+    yield f"gray_crop ({len(boxes)} boxes)", numpy_luma
+
+def decode_cases(frame, truth):
+    from scanPipeline import gray_crop, pad_boxes
+    from barcodeDecoders import zbar_values, build_chain, CropDecodePool
+    h, w = frame.shape[:2]
+    boxes = pad_boxes(np.array([t["box"] for t in truth]), 0.05, 4, w, h)
+    crops = [gray_crop(frame, b) for b in boxes]
+    got = sum(1 for c, t in zip(crops, truth) if t["code"] in zbar_values(c))
+    print(f"  zbar reads {got}/{len(crops)} synthetic labels", file=sys.stderr)
+
+    chain = build_chain()
+    pool = CropDecodePool("thread")
+    yield "zbar_values, one crop", lambda: zbar_values(crops[0])
+    yield f"zbar_values ({len(crops)} crops)", lambda: [zbar_values(c) for c in crops]
+    yield f"default chain ({len(crops)} crops)", lambda: [chain.decode(c) for c in crops]
+    yield f"thread pool decode_all ({len(crops)} crops)", lambda: pool.decode_all(crops)
+    #whole frame, for comparison with yolo + crops
+    full = gray_crop(frame, (0, 0, w, h))
+    yield "zbar_values, whole frame", lambda: zbar_values(full)
+
+def manifest_cases(n):
+    from manifestIndex import ManifestIndex
+    from jetsonBarcodeReaderv003 import load_manifest, MANIFEST_RULES
+    codes = sscc_codes(n)
+    fd, path = tempfile.mkstemp(suffix=".txt", prefix="manifest-")
+    with os.fdopen(fd, "w") as f:
+        f.write("\n".join(codes) + "\n")
+
+    def quiet_load():
+        #load_manifest prints a line every call
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            return load_manifest(path)
+
+    listed = quiet_load()
+    index = ManifestIndex(listed, **MANIFEST_RULES)
+    mid = codes[n // 2]
+    miss = sscc_codes(1, prefix="0099999")[0]
+    #manifest listing codes without their check digit, matched by the full read
+    bare_index = ManifestIndex([c[:-1] for c in listed], **dict(MANIFEST_RULES, check_digit_optional=True))
+
+    yield f"load_manifest ({n} codes)", quiet_load
+    yield f"ManifestIndex build ({n} codes)", lambda: ManifestIndex(listed, **MANIFEST_RULES)
+    yield "match hit", lambda: index.match(mid)
+    yield "match miss", lambda: index.match(miss)
+    yield "match gs1 (00) prefixed", lambda: index.match("(00)" + mid)
+    yield "match ]C1 + fnc1", lambda: index.match("]C1\x1d" + mid)
+    yield "match without check digit", lambda: bare_index.match(mid)
+    yield "list 'in' hit, old way", lambda: mid in listed
+    yield "list 'in' miss, old way", lambda: miss in listed
+    os.unlink(path)
+
+def convert_cases(frame):
+    from cameraSources import copy_frame
+    from scanPipeline import FramePool, downscale, gray_crop
+    h, w = frame.shape[:2]
+    pool = FramePool()
+
+    for name, img, ch in (("bgr", frame, 3), ("gray8", gray_crop(frame, (0, 0, w, h)), 1)):
+        row = w * ch
+        stride = (row + 3) & ~3
+        #appsink buffers are plain bytes with rows padded to 4
+        padded = np.zeros((h, stride), dtype=np.uint8)
+        padded[:, :row] = img.reshape(h, row)
+        data = padded.tobytes()
+        shape = (h, w, ch) if ch == 3 else (h, w)
+        out = pool.acquire(shape)
+
+        def naive(data=data, shape=shape, row=row, stride=stride):
+            return np.frombuffer(data, dtype=np.uint8).reshape((h, stride))[:, :row].reshape(shape).copy()
+
+        yield f"{name} buffer -> new array", naive
+        yield f"{name} buffer -> pool (copy_frame)", lambda data=data, out=out, ch=ch: copy_frame(data, w, h, ch, out)
+
+    yield "downscale bgr to 640", lambda: downscale(frame, 640)
+    yield "downscale bgr to 640, pooled", lambda: pool.release(downscale(frame, 640, pool))
+    yield "full frame gray (luma)", lambda: gray_crop(frame, (0, 0, w, h))
+
+def _spread(secs):
+    #same keys as timeit, for cases that time their own loop
+    us = sorted(s * 1e6 for s in secs)
+    return {"us": round(us[len(us) // 2], 2), "us_min": round(us[0], 2),
+            "us_p95": round(us[int(len(us) * 0.95)], 2), "calls": len(us)}
+
+def list_cases(n, batches=200, per=5, reorder_every=10):
+    #scan screen list at n codes. a hit batch is what the screen does per ui
+    #batch (10 Hz), the reorder moves/drops them about once a sec. each case
+    #marks fresh codes so these time their own loop instead of timeit
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    from manifestIndex import ManifestIndex
+    from jetsonBarcodeReaderv003 import ManifestListModel, manifest_list_view, MANIFEST_RULES
+    codes = sscc_codes(n)
+    hits = random.Random(0).sample(range(n), min(n, batches * per))
+
+    for order in ("manifest", "found_last", "remaining"):
+        model = ManifestListModel(ManifestIndex(codes, **MANIFEST_RULES), order)
+        model.add_codes(0, n)
+        view = manifest_list_view(model)
+        view.resize(600, 800)
+        view.show()
+        app.processEvents()
+
+        marks, moves = [], []
+        for k in range(0, len(hits), per):
+            t0 = time.perf_counter()
+            model.mark(hits[k:k + per])
+            app.processEvents()  #the repaint
+            marks.append(time.perf_counter() - t0)
+            if len(marks) % reorder_every == 0:
+                t0 = time.perf_counter()
+                model.reorder()
+                app.processEvents()
+                moves.append(time.perf_counter() - t0)
+        view.close()
+        yield f"{order}: {per} hits + repaint", _spread(marks)
+        if order != "manifest":
+            yield f"{order}: reorder {per * reorder_every} hits", _spread(moves)
+
+# ===================== runner =====================
+def run(groups=GROUPS, args=None):
+    args = args or parse_args([])
+    frame, truth = _scene(args)
+    cases = {
+        "crop": lambda: crop_cases(frame, truth),
+        "decode": lambda: decode_cases(frame, truth),
+        "manifest": lambda: manifest_cases(args.codes),
+        "convert": lambda: convert_cases(frame),
+        "list": lambda: list_cases(args.codes),
+    }
+    results = []
+    for g in groups:
+        print(f"[{g}]", file=sys.stderr)
+        for name, fn in cases[g]():
+            r = fn if isinstance(fn, dict) else timeit(fn, args.min_time)
+            r.update(group=g, case=name)
+            results.append(r)
+            print(f"  {name:<44}{r['us']:>12.2f} us", file=sys.stderr)
+    return {
+        "frame": [args.width, args.height],
+        "labels": len(truth),
+        "codes": args.codes,
+        "scene": {"module": args.module, "skew": args.skew, "blur": args.blur, "noise": args.noise, "seed": args.seed},
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+
+def parse_args(argv):
+    ap = argparse.ArgumentParser(description="micro benchmarks for crop/decode, manifest lookup and frame conversion")
+    ap.add_argument("groups", nargs="*", help="any of " + ", ".join(GROUPS))
+    ap.add_argument("--width", type=int, default=1920)
+    ap.add_argument("--height", type=int, default=1080)
+    ap.add_argument("--labels", type=int, default=8, help="labels in the synthetic frame")
+    ap.add_argument("--codes", type=int, default=10000, help="manifest size for the lookup and list cases")
+    ap.add_argument("--module", type=int, default=2)
+    ap.add_argument("--skew", type=float, default=0.0)
+    ap.add_argument("--blur", type=float, default=0.0)
+    ap.add_argument("--noise", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--min-time", type=float, default=0.2, help="secs spent timing each case")
+    ap.add_argument("--json", help="write the results here")
+    args = ap.parse_args(argv)
+    bad = [g for g in args.groups if g not in GROUPS]
+    if bad:
+        ap.error("unknown group: " + ", ".join(bad))
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run(args.groups or GROUPS, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+'''
+camera sources for the barcode reader
+every camera gets its own gstreamer pipeline and capture thread, all of
+them feed one frame queue so a single yolo model serves the whole dock door
+
+camera specs:
+    csi:0                  jetson csi sensor-id 0 (nvarguscamerasrc)
+    file:/path/clip.mp4    recorded video through decodebin
+    dir:/path/frames       image folder, read in name order (no gstreamer)
+    test or test:ball      videotestsrc with that pattern, for benches
+a FrameSource feeds any python iterable of numpy frames the same way.
+replays run at their own frame rate (realtime) or as fast as the reader
+keeps up, and report eos once the recording runs out
+'''
+
+import os, time
+
+import numpy as np
+
+try:
+    import gi
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+except Exception:
+    Gst = None
+
+from scanPipeline import Frame, Stage, downscale, gray_crop
+from scanMetrics import NullMetrics
+from scanTrace import NullTrace
+
+SINK = "emit-signals=false max-buffers=1 drop=true sync=false"
+LEAKY = "queue max-size-buffers=1 leaky=downstream"
+#recorded video: play at file speed, or hand over every frame as fast as it is pulled
+REPLAY_SINK = "emit-signals=false max-buffers=1 drop=true sync=true"
+FAST_SINK = "emit-signals=false max-buffers=2 drop=false sync=false"
+FAST_QUEUE = "queue max-size-buffers=2"
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+# ===================== source specs =====================
+class CameraSource:
+    def __init__(self, spec, width=1920, height=1080, fps=5, realtime=True):
+        self.spec = spec
+        kind, _, arg = spec.partition(":")
+        self.kind = kind or "csi"
+        self.arg = arg
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.realtime = realtime  #only matters for file:, live cameras are always realtime
+
+    def capture(self, cam, pool, **kw):
+        return CameraCapture(self, cam, pool, **kw)
+
+    def _head(self):
+        #source part of the pipeline, (string, is_nvmm)
+        if self.kind == "csi":
+            sensor = self.arg or "0"
+            return (
+                f"nvarguscamerasrc sensor-id={sensor} ! "
+                f"video/x-raw(memory:NVMM), width={self.width}, height={self.height}, framerate={self.fps}/1 ! "
+            ), True
+        if self.kind == "file":
+            return f'filesrc location="{self.arg}" ! decodebin ! ', False
+        if self.kind == "test":
+            pattern = self.arg or "smpte"
+            return (
+                f"videotestsrc is-live=true pattern={pattern} ! "
+                f"video/x-raw, width={self.width}, height={self.height}, framerate={self.fps}/1 ! "
+            ), False
+        raise ValueError(f"unknown camera spec {self.spec}")
+
+    def pipeline(self, mode="bgr", luma_format="GRAY8", detect_width=640):
+        head, nvmm = self._head()
+        conv = "nvvidconv" if nvmm else "videoconvert ! videoscale"
+        sink, leaky = SINK, LEAKY
+        if self.kind == "file":
+            sink, leaky = (REPLAY_SINK, LEAKY) if self.realtime else (FAST_SINK, FAST_QUEUE)
+
+        if mode != "gray":
+            #basic pipeline like before, one bgr sink for everything
+            if nvmm:
+                head += "nvvidconv ! video/x-raw, format=BGRx ! "
+            return head + f"videoconvert ! video/x-raw, format=BGR ! appsink name=sink {sink}"
+
+        #tee the stream, the luma plane goes to zbar and only the small yolo
+        #branch gets colour converted (on nvmm nvvidconv does both in hw)
+        det_w = detect_width
+        det_h = int(round(self.height * det_w / self.width / 2)) * 2
+        luma = luma_format if nvmm else "GRAY8"
+        return (
+            head + "tee name=t "
+            f"t. ! {leaky} ! {conv} ! video/x-raw, format={luma} ! appsink name=luma {sink} "
+            f"t. ! {leaky} ! {conv} ! video/x-raw, format=BGRx, width={det_w}, height={det_h} ! "
+            f"videoconvert ! video/x-raw, format=BGR ! appsink name=sink {sink}"
+        )
+
+class FrameSource:
+    #frames straight from python, a list, a function returning a fresh
+    #iterator, or a one shot iterator. bgr (h, w, 3) or gray (h, w) uint8
+    #fps 0 = as fast as the reader takes them
+    def __init__(self, frames, fps=0, loop=False, spec="array"):
+        self.spec = spec
+        self.kind = "array"
+        self.fps = fps
+        self.loop = loop
+        if callable(frames):
+            self._make = frames
+        elif isinstance(frames, (list, tuple)):
+            self._make = lambda: iter(frames)
+        else:
+            self._make = lambda it=iter(frames): it
+
+    def frames(self):
+        return self._make()
+
+    def capture(self, cam, pool, **kw):
+        return ArrayCapture(self, cam, pool, **kw)
+
+def read_image(path):
+    #bgr uint8, cv2 if its there (jetpack), pil otherwise
+    try:
+        import cv2
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None:
+            return img
+    except ImportError:
+        pass
+    from PIL import Image
+    return np.asarray(Image.open(path).convert("RGB"))[:, :, ::-1].copy()
+
+def image_dir_source(path, fps=0, loop=False):
+    files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTS))
+    if not files:
+        raise FileNotFoundError(f"no images in {path}")
+    return FrameSource(lambda: (read_image(f) for f in files), fps, loop, spec=f"dir:{path}")
+
+def parse_cameras(specs, width=1920, height=1080, fps=5, realtime=True):
+    #spec strings and/or ready made sources (FrameSource etc) in one list
+    if isinstance(specs, str):
+        specs = [s for s in specs.split(",") if s.strip()]
+    out = []
+    for s in specs:
+        if not isinstance(s, str):
+            out.append(s)
+        elif s.strip().startswith("dir:"):
+            out.append(image_dir_source(s.strip()[4:], fps if realtime else 0))
+        else:
+            out.append(CameraSource(s.strip(), width, height, fps, realtime))
+    return out
+
+# ===================== capture =====================
+def copy_frame(data, w, h, channels, out):
+    #raw video bytes into out (h, w[, c]), rows are padded to 4 bytes and
+    #for nv12 the luma plane is just the first h rows
+    row = w * channels
+    stride = (row + 3) & ~3
+    src = np.frombuffer(data, dtype=np.uint8, count=h * stride).reshape((h, stride))
+    np.copyto(out, src[:, :row].reshape(out.shape))
+    return out
+
+class CameraCapture:
+    #one running pipeline, grab() turns its newest sample(s) into a Frame
+    def __init__(self, source, cam, pool, mode="bgr", luma_format="GRAY8", detect_width=640, pull_timeout=0.5, metrics=None):
+        self.source = source
+        self.cam = cam
+        self.pool = pool
+        self.mode = mode
+        self.metrics = metrics or NullMetrics()
+        self.pipeline_str = source.pipeline(mode, luma_format, detect_width)
+        self.pull_ns = int(pull_timeout * 1e9)
+        self.frames = 0
+        self.eos = False  #recorded source ran out
+        self._pipeline = None
+        self._sink = None
+        self._luma = None
+
+    def start(self):
+        if Gst is None:
+            raise RuntimeError("gstreamer python bindings missing")
+        Gst.init(None)
+        self._pipeline = Gst.parse_launch(self.pipeline_str)
+        self._sink = self._pipeline.get_by_name("sink")
+        self._luma = self._pipeline.get_by_name("luma")
+        self._pipeline.set_state(Gst.State.PLAYING)
+
+    def stop(self):
+        if self._pipeline is not None:
+            self._pipeline.set_state(Gst.State.NULL)
+            self._pipeline = None
+
+    def _copy_sample(self, sample, channels):
+        #the one copy per frame, out of the gst buffer into a pooled array
+        buf = sample.get_buffer()
+        caps = sample.get_caps()
+        w = caps.get_structure(0).get_value("width")
+        h = caps.get_structure(0).get_value("height")
+        shape = (h, w, channels) if channels > 1 else (h, w)
+
+        with self.metrics.time("convert_seconds"):
+            ok, map_info = buf.map(Gst.MapFlags.READ)
+            if not ok:
+                return None
+
+            arr = self.pool.acquire(shape)
+            try:
+                copy_frame(map_info.data, w, h, channels, arr)
+            except Exception:
+                self.pool.release(arr)
+                raise
+            finally:
+                buf.unmap(map_info)
+        return arr
+
+    def _pull(self, sink):
+        with self.metrics.time("pull_wait_seconds"):
+            return sink.emit("try-pull-sample", self.pull_ns)
+
+    def _check_eos(self):
+        if self._sink.get_property("eos"):
+            self.eos = True
+
+    def grab(self):
+        #newest frame or None, try-pull so stop never hangs on a dead camera
+        if self.eos:
+            time.sleep(0.05)
+            return None
+        if self._luma is None:
+            sample = self._pull(self._sink)
+            if sample is None:
+                self._check_eos()
+                return None
+            pixels = self._copy_sample(sample, 3)
+            return self._frame(pixels) if pixels is not None else None
+
+        luma = self._pull(self._luma)
+        det = self._pull(self._sink)
+        if luma is None or det is None:
+            self._check_eos()
+            return None
+
+        #both branches come off the same tee so pts should match, catch up once if not
+        slack = Gst.SECOND // (2 * self.source.fps)
+        lp, dp = luma.get_buffer().pts, det.get_buffer().pts
+        if lp + slack < dp:
+            luma = self._pull(self._luma)
+        elif dp + slack < lp:
+            det = self._pull(self._sink)
+        if luma is None or det is None:
+            return None
+
+        pixels = self._copy_sample(luma, 1)
+        small = self._copy_sample(det, 3) if pixels is not None else None
+        if small is None:
+            if pixels is not None:
+                self.pool.release(pixels)
+            return None
+
+        scale = (pixels.shape[1] / small.shape[1], pixels.shape[0] / small.shape[0])
+        return self._frame(pixels, small, scale)
+
+    def _frame(self, pixels, det=None, scale=(1.0, 1.0)):
+        self.frames += 1
+        self.metrics.inc("frames_total")
+        return Frame(pixels, self.pool, index=self.frames, det=det, scale=scale, camera=self.cam)
+
+class ArrayCapture:
+    #same job as CameraCapture for a FrameSource, frames get copied into
+    #pool buffers and split into luma + small bgr in gray mode like gst would
+    def __init__(self, source, cam, pool, mode="bgr", luma_format="GRAY8", detect_width=640, pull_timeout=0.5, metrics=None):
+        self.source = source
+        self.cam = cam
+        self.pool = pool
+        self.mode = mode
+        self.metrics = metrics or NullMetrics()
+        self.detect_width = detect_width
+        self.pull_timeout = pull_timeout
+        self.frames = 0
+        self.eos = False
+        self._it = None
+        self._next_t = 0.0
+
+    def start(self):
+        self._it = self.source.frames()
+        self._next_t = time.monotonic()
+
+    def stop(self):
+        self._it = None
+
+    def _next(self):
+        img = next(self._it, None)
+        if img is None and self.source.loop:
+            self._it = self.source.frames()
+            img = next(self._it, None)
+        return img
+
+    def grab(self):
+        if self.eos or self._it is None:
+            time.sleep(0.05)
+            return None
+        if self.source.fps:
+            #play back at the source frame rate like a camera would
+            left = self._next_t - time.monotonic()
+            if left > 0:
+                time.sleep(min(left, self.pull_timeout))
+                if left > self.pull_timeout:
+                    return None
+            self._next_t = max(self._next_t + 1.0 / self.source.fps, time.monotonic() - 1.0)
+
+        with self.metrics.time("pull_wait_seconds"):
+            img = self._next()
+        if img is None:
+            self.eos = True
+            return None
+        with self.metrics.time("convert_seconds"):
+            return self._convert(np.asarray(img, dtype=np.uint8))
+
+    def _convert(self, img):
+        bgr = img if img.ndim == 3 else np.repeat(img[:, :, None], 3, axis=2)
+
+        if self.mode != "gray":
+            pixels = self.pool.acquire(bgr.shape)
+            np.copyto(pixels, bgr)
+            return self._frame(pixels)
+
+        h, w = img.shape[:2]
+        pixels = self.pool.acquire((h, w))
+        np.copyto(pixels, img if img.ndim == 2 else gray_crop(img, (0, 0, w, h)))
+        small = downscale(bgr, self.detect_width, self.pool) if self.detect_width and w > self.detect_width else None
+        if small is None:
+            small = self.pool.acquire(bgr.shape)
+            np.copyto(small, bgr)
+        return self._frame(pixels, small, (w / small.shape[1], h / small.shape[0]))
+
+    def _frame(self, pixels, det=None, scale=(1.0, 1.0)):
+        self.frames += 1
+        self.metrics.inc("frames_total")
+        return Frame(pixels, self.pool, index=self.frames, det=det, scale=scale, camera=self.cam)
+
+class CaptureManager:
+    #starts every camera and runs one capture stage per camera into out_q
+    def __init__(self, sources, pool, out_q, pacer=None, on_error=None, trace=None, **capture_kw):
+        self.captures = [src.capture(i, pool, **capture_kw) for i, src in enumerate(sources)]
+        self.out_q = out_q
+        self.pacer = pacer
+        self.trace = trace or NullTrace()
+        self.stages = [
+            Stage(f"capture{c.cam}", self._loop_fn(c), on_error=on_error)
+            for c in self.captures
+        ]
+
+    def _loop_fn(self, cap):
+        def capture():
+            t0 = self.pacer.begin() if self.pacer else None
+            try:
+                t_grab = time.monotonic()
+                frame = cap.grab()
+                if frame is not None:
+                    self.trace.add("capture", t_grab, time.monotonic(), "capture", camera=cap.cam, index=frame.index)
+                    self.out_q.put(frame)
+            finally:
+                if self.pacer:
+                    self.pacer.wait(t0)
+        return capture
+
+    def start(self):
+        for c in self.captures:
+            c.start()
+        for st in self.stages:
+            st.start()
+
+    def stop(self):
+        for st in self.stages:
+            st.stop()
+        for st in self.stages:
+            st.join(1.0)
+        for c in self.captures:
+            c.stop()
+
+    def finished(self):
+        #every source was a recording and they all ran out
+        return all(c.eos for c in self.captures)
+
+    def frames(self):
+        return sum(c.frames for c in self.captures)
+
+    def __len__(self):
+        return len(self.captures)
@@ -0,0 +1,275 @@
+'''
+detector side of the barcode reader
+picks the inference runtime (torch eager, onnx runtime or openvino, fp32
+or int8) and keeps exported models in a cache keyed by the .pt hash so the
+export only ever runs once per model. the model loads and warms up on a
+background thread at startup and stays loaded for every order after that.
+the batch scheduler sits in front of
+the model, it collects frames from one camera or many for a short deadline
+and runs one predict for all of them
+
+one time export / calibration:
+    python detectorBackends.py export --backend onnx --int8 --calib calib_images/
+    python detectorBackends.py export --backend openvino --int8 --calib data.yaml
+quick cpu timing of a backend:
+    python detectorBackends.py time --backend onnx --int8
+'''
+
+import os, sys, time, shutil, hashlib, argparse, threading
+
+MODEL_PATH = "my_model.pt"
+CACHE_DIR = os.environ.get("DETECTOR_CACHE", os.path.expanduser("~/.cache/jetsonBarcodeReader/models"))
+BACKENDS = ("torch", "onnx", "openvino")
+
+# ===================== model cache =====================
+def model_hash(path):
+    #sha256 of the weights, so a retrained model never reuses an old export
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+def artifact_path(model_path, backend, int8=False, imgsz=640):
+    #where the exported model for these options lives (may not exist yet)
+    if backend == "torch":
+        return model_path
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    name = f"{stem}-{model_hash(model_path)}-{imgsz}-{backend}{'-int8' if int8 else ''}"
+    if backend == "onnx":
+        return os.path.join(CACHE_DIR, name + ".onnx")
+    if backend == "openvino":
+        #ultralytics wants openvino models in a *_openvino_model folder
+        return os.path.join(CACHE_DIR, name + "_openvino_model")
+    raise ValueError(f"unknown detector backend {backend}")
+
+def _letterbox(path, imgsz):
+    #calibration image the way ultralytics feeds the model, 1x3xNxN float rgb
+    import numpy as np
+    from PIL import Image
+    img = Image.open(path).convert("RGB")
+    r = imgsz / max(img.size)
+    img = img.resize((max(1, round(img.width * r)), max(1, round(img.height * r))), Image.BILINEAR)
+    canvas = Image.new("RGB", (imgsz, imgsz), (114, 114, 114))
+    canvas.paste(img, ((imgsz - img.width) // 2, (imgsz - img.height) // 2))
+    arr = np.asarray(canvas, dtype=np.float32) / 255.0
+    return arr.transpose(2, 0, 1)[None]
+
+def _quantize_onnx(src, dst, calib=None, imgsz=640):
+    #static int8 with calibration images if we have them, dynamic otherwise
+    from onnxruntime import quantization as q
+
+    if not calib:
+        q.quantize_dynamic(src, dst, weight_type=q.QuantType.QUInt8)
+        return
+
+    exts = (".jpg", ".jpeg", ".png", ".bmp")
+    files = sorted(os.path.join(calib, f) for f in os.listdir(calib) if f.lower().endswith(exts))
+    if not files:
+        raise FileNotFoundError(f"no calibration images in {calib}")
+
+    import onnxruntime
+    input_name = onnxruntime.InferenceSession(src, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class Reader(q.CalibrationDataReader):
+        def __init__(self):
+            self._files = iter(files)
+
+        def get_next(self):
+            f = next(self._files, None)
+            return None if f is None else {input_name: _letterbox(f, imgsz)}
+
+    q.quantize_static(src, dst, Reader(), quant_format=q.QuantFormat.QDQ, per_channel=True)
+
+def export_model(model_path=MODEL_PATH, backend="onnx", int8=False, imgsz=640, calib=None):
+    #one time export into the cache, returns the artifact path
+    dst = artifact_path(model_path, backend, int8, imgsz)
+    if backend == "torch" or os.path.exists(dst):
+        return dst
+
+    from ultralytics import YOLO
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    model = YOLO(model_path)
+
+    if backend == "onnx":
+        #dynamic so batched predicts work, int8 is done with onnx runtime after
+        out = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            _quantize_onnx(out, dst, calib, imgsz)
+            os.remove(out)
+        else:
+            shutil.move(out, dst)
+        return dst
+
+    #openvino int8 calibrates through ultralytics with a dataset yaml
+    kw = {"int8": True, "data": calib} if int8 and calib else {"int8": int8}
+    out = model.export(format="openvino", imgsz=imgsz, dynamic=True, **kw)
+    shutil.move(out, dst)
+    return dst
+
+def load_detector(model_path=MODEL_PATH, backend="torch", int8=False, imgsz=640, fallback=True):
+    #(model, path) for the chosen runtime, every backend goes through the
+    #same ultralytics predict api so the reader doesnt care which one it got.
+    #a missing export falls back to the .pt instead of exporting mid shift
+    from ultralytics import YOLO
+
+    path = artifact_path(model_path, backend, int8, imgsz)
+    if backend != "torch" and not os.path.exists(path):
+        if not fallback:
+            raise FileNotFoundError(f"{path} missing, run: python detectorBackends.py export --backend {backend}")
+        print(f"no {backend} export for {model_path}, using torch (run detectorBackends.py export)")
+        path = model_path
+    return YOLO(path, task="detect"), path
+
+# ===================== warm start =====================
+class WarmDetector(threading.Thread):
+    #loads the model and runs dummy predicts on a background thread so the
+    #first real frame doesnt pay for cuda/cudnn/graph setup. started while the
+    #ui comes up, the reader only opens the camera once wait() returns
+    def __init__(self, model_path=MODEL_PATH, backend="torch", int8=False, imgsz=640, shape=(360, 640, 3), batch=1):
+        super().__init__(daemon=True, name="detector-warmup")
+        self.model_path = model_path
+        self.backend = backend
+        self.int8 = int8
+        self.imgsz = imgsz
+        self.shape = shape  #detect image size the reader will feed it
+        self.batch = batch  #warm this batch size too, not just single frames
+        self.model = None
+        self.path = None
+        self.error = None
+        self.load_s = 0.0
+        self.warm_s = 0.0
+        self.ready = threading.Event()
+
+    def run(self):
+        try:
+            import numpy as np
+            t0 = time.perf_counter()
+            model, path = load_detector(self.model_path, self.backend, self.int8, self.imgsz)
+            t1 = time.perf_counter()
+            img = np.zeros(self.shape, dtype=np.uint8)
+            for n in sorted({1, self.batch}):
+                model.predict([img] * n, imgsz=self.imgsz, verbose=False)
+            self.load_s = t1 - t0
+            self.warm_s = time.perf_counter() - t1
+            self.model, self.path = model, path
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+
+    def wait(self, timeout=None):
+        #the warmed model (None on timeout), raises if loading failed
+        if not self.ready.wait(timeout):
+            return None
+        if self.error is not None:
+            raise self.error
+        return self.model
+
+_warm = {}
+_warm_lock = threading.Lock()
+
+def warm_detector(model_path=MODEL_PATH, backend="torch", int8=False, imgsz=640, shape=(360, 640, 3), batch=1):
+    #one warm detector per model/runtime for the whole process, later calls
+    #get the same (already loaded) one back, a failed load gets retried
+    key = (model_path, backend, int8, imgsz)
+    with _warm_lock:
+        w = _warm.get(key)
+        if w is None or (w.ready.is_set() and w.error is not None):
+            w = WarmDetector(model_path, backend, int8, imgsz, shape, batch)
+            w.start()
+            _warm[key] = w
+        return w
+
+# ===================== batching =====================
+class BatchScheduler:
+    #max_batch frames per predict, max_wait secs to wait for the batch to
+    #fill after the first frame shows up (0 = take only whats already queued)
+    def __init__(self, predict_fn, max_batch=4, max_wait=0.02):
+        self.predict_fn = predict_fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait
+        self.batches = 0
+        self.images = 0
+        self.gathers = 0
+        self.waited = 0.0
+        self.sizes = {}
+        self._lock = threading.Lock()
+
+    def gather(self, first, inbox):
+        #first item plus whatever else arrives before the deadline
+        if self.max_batch == 1:
+            return [first]
+        t0 = time.monotonic()
+        rest = inbox.take_until(self.max_batch - 1, t0 + self.max_wait)
+        with self._lock:
+            self.gathers += 1
+            self.waited += time.monotonic() - t0
+        return [first] + rest
+
+    def predict(self, images):
+        #results line up with images, big lists get split into max_batch runs
+        out = []
+        for i in range(0, len(images), self.max_batch):
+            chunk = images[i:i + self.max_batch]
+            res = self.predict_fn(chunk)
+            out.extend(res if res is not None else [None] * len(chunk))
+            with self._lock:
+                self.batches += 1
+                self.images += len(chunk)
+                self.sizes[len(chunk)] = self.sizes.get(len(chunk), 0) + 1
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            avg = self.images / self.batches if self.batches else 0.0
+            wait = self.waited / self.gathers if self.gathers else 0.0
+            return {
+                "batches": self.batches,
+                "avg_batch": round(avg, 2),
+                "avg_wait_ms": round(wait * 1000, 2),
+                "sizes": dict(self.sizes),
+            }
+
+# ===================== command line =====================
+def _time_backend(args):
+    import numpy as np
+    t0 = time.perf_counter()
+    model, path = load_detector(args.model, args.backend, args.int8, args.imgsz, fallback=False)
+    load_s = time.perf_counter() - t0
+
+    img = np.random.randint(0, 255, (args.imgsz * 9 // 16, args.imgsz, 3), dtype=np.uint8)
+    model.predict(img, imgsz=args.imgsz, verbose=False)  #first run pays for setup
+    times = []
+    for _ in range(args.runs):
+        t = time.perf_counter()
+        model.predict([img] * args.batch, imgsz=args.imgsz, verbose=False)
+        times.append((time.perf_counter() - t) * 1000)
+    times.sort()
+    print(f"{path}")
+    print(f"load {load_s * 1000:.0f} ms, batch {args.batch}: "
+          f"p50 {times[len(times) // 2]:.1f} ms, p90 {times[int(len(times) * 0.9)]:.1f} ms")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="export / time the barcode detector")
+    ap.add_argument("cmd", choices=["export", "time", "path"])
+    ap.add_argument("--model", default=MODEL_PATH)
+    ap.add_argument("--backend", choices=BACKENDS, default="onnx")
+    ap.add_argument("--int8", action="store_true")
+    ap.add_argument("--calib", help="image folder (onnx) or dataset yaml (openvino) for int8")
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--runs", type=int, default=30)
+    ap.add_argument("--batch", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        t0 = time.perf_counter()
+        out = export_model(args.model, args.backend, args.int8, args.imgsz, args.calib)
+        print(f"{out} ({time.perf_counter() - t0:.1f} s)")
+    elif args.cmd == "path":
+        print(artifact_path(args.model, args.backend, args.int8, args.imgsz))
+    else:
+        _time_backend(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
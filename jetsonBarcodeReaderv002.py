@@ -243,6 +243,7 @@ class ScanScreen(QWidget):
 
         self.log = QTextEdit()
         self.log.setReadOnly(True)
+        self.log.document().setMaximumBlockCount(500)  #ring buffer, oldest lines fall off
         lay.addWidget(self.log)
 
         #start worker
@@ -1,32 +1,89 @@
 '''
 using a single csi camera, yolo, and a manifest set in downloads
 should start scanning immediately and jumps to view order when done
+orders (manifest + trailer + dock door) queue up and run one after another,
+the camera, model and decoder pool stay up the whole time, X on the view
+order screen starts the next one
+heavy imports + install checks run in parallel while the window paints,
+see scanBootstrap for the startup timing report
 '''
 
-import sys, os, time
-from pathlib import Path
+import sys, os, time, threading
 from datetime import datetime
 
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from PyQt5.QtGui import QFont
-from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout, QStackedWidget, QTextEdit, QScrollArea, QGridLayout)
+from scanBootstrap import start_bootstrap, current as current_bootstrap
+
+from collections import deque
+
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QFont, QKeySequence, QColor, QBrush, QPixmap, QPainter
+from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QStackedWidget, QTextEdit, QScrollArea, QGridLayout,
+                             QShortcut, QTreeView, QAbstractItemView, QFrame, QProgressBar)
+
+from manifestIndex import ManifestIndex, ManifestLoader, iter_manifest
+from detectorBackends import BatchScheduler, MODEL_PATH, warm_detector
+from scanSession import Order, OrderQueue, load_orders
+from scanEventStore import EventStore, DB_PATH
+from scanEvents import EventCoalescer
+from scanMetrics import Metrics, NullMetrics, serve_metrics
+from scanTrace import TraceRecorder, NullTrace
+
+#cameras for this dock door, comma separated specs (see cameraSources)
+CAMERAS = os.environ.get("CAMERAS", "csi:0")
+
+#detector runtime: torch, onnx or openvino (export first, see detectorBackends)
+DETECTOR_BACKEND = os.environ.get("DETECTOR_BACKEND", "torch")
+DETECTOR_INT8 = os.environ.get("DETECTOR_INT8", "0") == "1"
+
+#how manifest codes and reads get matched, see ManifestIndex
+MANIFEST_RULES = dict(upper=True, gs1=True, strip_zeros=False, check_digit_optional=False)
+
+#txt, csv, json or jsonl, override with MANIFEST_PATH or the first arg
+MANIFEST_PATH = os.environ.get("MANIFEST_PATH", "/home/design25/Documents/barcodes.txt")
+
+def manifest_path():
+    return sys.argv[1] if len(sys.argv) > 1 else MANIFEST_PATH
+
+#optional csv/jsonl list of orders (manifest, trailer, dock_door), see scanSession
+#without one every order is the manifest above at this trailer/door
+ORDERS_PATH = os.environ.get("ORDERS_PATH", "")
+TRAILER = os.environ.get("TRAILER", "")
+DOCK_DOOR = os.environ.get("DOCK_DOOR", "")
+
+#stage timers + counters (see scanMetrics), F3 on the scan screen shows them,
+#METRICS_PORT also serves them as prometheus text on localhost
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0") or 0)
+METRICS = os.environ.get("METRICS", "0") == "1" or METRICS_PORT > 0
+
+#per frame trace spans (see scanTrace), dumped with F4 or when a frame
+#takes longer than TRACE_SLOW_MS from capture to decoded (0 = only F4)
+TRACE = os.environ.get("TRACE", "0") == "1"
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "1000"))
+
+#scan screen list order: "manifest", "found_last" (found codes sink to the
+#bottom) or "remaining" (found codes drop off the list). with the last two a
+#hit gets struck out in place first and moves up to a second later
+LIST_ORDER = os.environ.get("LIST_ORDER", "manifest")
+
+#bottom left of the scan screen, left empty if the file isnt there
+CYAN_LOGO_PATH = os.environ.get("LOGO_PATH", "/home/design25/Documents/cyan_logo.png")
 
 # ===================== simple manifest loader =====================
-def load_manifest():
-    manifest_path = "/home/design25/Documents/barcodes.txt"
+def load_manifest(path=None):
+    #whole manifest as a list in one go, the app streams it with ManifestLoader
+    path = path or manifest_path()
 
     print("loading manifest from documents folder...")
 
-    if not os.path.exists(manifest_path):
+    if not os.path.exists(path):
         print("manifest missing, making empty list")
         return []
 
-    txt = Path(manifest_path).read_text(encoding="utf-8", errors="ignore")
-    parts = [p.strip() for p in txt.split() if p.strip()]
     uniq = []
     seen = set()
-    for p in parts:
-        if p not in seen:
+    for p, _ in iter_manifest(path):
+        p = p.strip()
+        if p and p not in seen:
             uniq.append(p)
             seen.add(p)
     return uniq
@@ -34,7 +91,7 @@ def load_manifest():
 # ===================== view order screen =====================
 class ViewOrderScreen(QWidget):
     #this screen lists finished scan summary
-    return_to_welcome = pyqtSignal()
+    next_order = pyqtSignal()
 
     def __init__(self):
         super().__init__()
@@ -69,15 +126,21 @@ class ViewOrderScreen(QWidget):
 
         self._next_row = 1
 
-        self.status = QLabel("Press X to restart")
+        self.status = QLabel("Press X for the next trailer")
         self.status.setAlignment(Qt.AlignCenter)
         self.status.setFont(QFont("Arial", 12, QFont.Bold))
         layout.addWidget(self.status)
 
-    def add_order(self, start_time, end_time, scanned_count):
+    def set_queued(self, count):
+        if count:
+            self.status.setText(f"Press X for the next trailer ({count} queued)")
+        else:
+            self.status.setText("Press X for the next trailer")
+
+    def add_order(self, start_time, end_time, scanned_count, trailer="", dockDoor=""):
         duration = end_time - start_time
-        dockDoor = "DOOR03"
-        trailer = "A953-0624"  #hardcoded placeholder for class demo
+        trailer = trailer or "-"
+        dockDoor = dockDoor or "-"
 
         start_str = start_time.strftime("%H:%M:%S")
         end_str = end_time.strftime("%H:%M:%S")
@@ -95,147 +158,764 @@ class ViewOrderScreen(QWidget):
 
     def keyPressEvent(self, event):
         if event.key() in (Qt.Key_X, Qt.Key_C):
-            python = sys.executable
-            os.execv(python, [python] + sys.argv)
+            #next trailer in process, the model stays loaded
+            self.next_order.emit()
 
 # ===================== barcode reader worker =====================
 class barcodeReader(QThread):
-    log = pyqtSignal(str)
-    decoded = pyqtSignal(str)
+    #log and decoded arrive in batches every ui_interval secs, not per frame
+    log = pyqtSignal(str)        #one or more lines, newline separated
+    decoded = pyqtSignal(list)   #values read since the last batch, each once per order
     finished_all = pyqtSignal()
+    stats = pyqtSignal(dict)
 
     def __init__(self, manifest_codes):
         super().__init__()
-        self.codes = [c.strip() for c in manifest_codes]
-        self._found = set()
+        #shared with the scan screen, a plain list of codes still works
+        if isinstance(manifest_codes, ManifestIndex):
+            self.index = manifest_codes
+        else:
+            self.index = ManifestIndex(manifest_codes, **MANIFEST_RULES)
         self._stop = False
-
-        #scan timing
-        self.fps_delay = 0.2
+        self._done = False
+        self._finished = False
+        self._lock = threading.Lock()
+
+        #ui updates, worker threads queue events and the run loop sends
+        #them as one batch every ui_interval secs (0.1 = 10 Hz)
+        self.ui_interval = 0.1
+        self._events = EventCoalescer()
+
+        #scan timing, full speed while codes are showing up, slow down when idle
+        self.frame_budget = 0.0
+        self.idle_budget = 0.2
+        self.idle_after = 10
+        self.pull_timeout = 0.5
+        self._pacer = None
+
+        #camera + capture mode, one capture thread per camera, one shared model
+        #"bgr" = one bgr appsink for everything (old way)
+        #"gray" = full res luma plane for zbar + small bgr branch just for yolo
+        self.cameras = CAMERAS
+        self.cam_width = 1920
+        self.cam_height = 1080
+        self.cam_fps = 5
+        self.capture_mode = "bgr"
+        self.luma_format = "GRAY8"  #or NV12, only the y plane gets read
+
+        #replays (file:, dir:, FrameSource), realtime = play at the recorded
+        #frame rate, lossless = queues wait instead of dropping frames,
+        #stop_at_eos = stop once every recording ran out and the queues drained
+        self.realtime = True
+        self.lossless = False
+        self.stop_at_eos = False
+
+        #yolo runs on a detect_width copy (None = full frame), zbar still
+        #decodes full res pixels inside the mapped back + padded boxes
+        self.detect_width = 640
+        self.roi_pad = 0.15
+        self.roi_pad_px = 6
+
+        #tracker mode, yolo every detect_every frames (1 = every frame) or when
+        #the picture moves more than motion_thresh, tracked boxes in between
+        self.detect_every = 1
+        self.motion_thresh = 6.0
+        self.track_pad = 0.1  #extra padding on guessed boxes
+
+        #already decoded regions skip zbar for cache_ttl secs after they were
+        #read, matched by track id, or by crop hash when cache_hash is on
+        #(0 ttl = off), track hits always check the crop hash too
+        #a hit doesnt extend it, the region is decoded again once cache_ttl
+        #is up, a label swapped in under the same box shows up then
+        self.cache_ttl = 0.5
+        self.cache_hash = True
+        self._cache = None
+
+        #crops of one frame fan out over this pool, "thread", "process" or None
+        self.crop_pool = "thread"
+        self.crop_workers = None  #defaults to the core count
+
+        #decoder chain, stops at the first read, steps missing a backend are
+        #dropped. per step budgets live in barcodeDecoders.DEFAULT_BUDGETS
+        self.decoder_chain = ["zbar", "binarize", "sharpen", "upscale", "rotate", "zxing"]
+        self.decoder_budgets = None
+        self.decode_budget_ms = 40  #whole chain, per crop
+
+        #straighten skewed labels inside the yolo box before decoding
+        self.rectify = True
+        self.rectify_min_angle = 4.0
+        self._crop_pool = None
+
+        #detector runtime + the exported model size it was built for
+        self.detector_backend = DETECTOR_BACKEND
+        self.detector_int8 = DETECTOR_INT8
+        self.detector_imgsz = 640
+
+        #yolo batching, up to detect_batch frames (any camera) per predict,
+        #waiting at most detect_max_wait secs for the batch to fill, only with
+        #more than one camera, one camera has nothing to wait for
+        self.detect_batch = 4
+        self.detect_max_wait = 0.02
+        self._batcher = None
+
+        #pipeline sizes, capture -> yolo -> zbar pool
+        self.frame_queue_size = 2
+        self.decode_queue_size = 4
+        self.decode_workers = 2
+        self.stats_every = 2.0
+
+        #set by set_manifest, the detect stage drops tracks + cache before the next frame
+        self._reset = False
+
+        #timers + counters, NullMetrics does nothing so it costs nothing when off
+        self.metrics = Metrics() if METRICS else NullMetrics()
+        self.trace = TraceRecorder(slow_ms=TRACE_SLOW_MS) if TRACE else NullTrace()
+
+        #every decode gets recorded here when set (see scanEventStore)
+        self.store = None
+        self.order_id = None
+
+        #monotonic times for benches, camera start and order complete
+        self.started_at = None
+        self.completed_at = None
+        self._capture = None
+
+        self._stages = []
+        self._queues = []
+        self._pool = None
 
     def stop(self):
         self._stop = True
 
-    def _make_pipeline(self):
-        #basic csi pipeline like before
-        return (
-            "nvarguscamerasrc sensor-id=0 ! "
-            "video/x-raw(memory:NVMM), width=1920, height=1080, framerate=5/1 ! "
-            "nvvidconv ! video/x-raw, format=BGRx ! "
-            "videoconvert ! video/x-raw, format=BGR ! "
-            "appsink name=sink emit-signals=false max-buffers=1 drop=true sync=false"
-        )
+    def set_manifest(self, manifest, order_id=None):
+        #next order, the camera, model and pools keep running, only the
+        #manifest and the per order tracking state get swapped
+        index = manifest if isinstance(manifest, ManifestIndex) else ManifestIndex(manifest, **MANIFEST_RULES)
+        with self._lock:
+            self.index = index
+            self.order_id = order_id
+            self._done = False
+            self._finished = False
+            self._reset = True
+            self._events.reset()
+            self.completed_at = None
+        if self._pacer:
+            self._pacer.note_new()
+
+    def stage_stats(self):
+        #queue depths + per stage latency, safe to call from the ui thread
+        from scanPipeline import pipeline_stats
+        out = pipeline_stats(self._stages, self._queues)
+        if self._pool is not None:
+            out["frame_pool"] = self._pool.snapshot()
+        if self._cache is not None:
+            out["decode_cache"] = self._cache.snapshot()
+        if self._crop_pool is not None:
+            out["decoder"] = self._crop_pool.chain.snapshot()
+        if self._batcher is not None:
+            out["detect_batches"] = self._batcher.snapshot()
+        return out
+
+    def _handle_values(self, decoded_vals, where=None):
+        #called from the decode workers, one frame worth of values at a time
+        #where maps a value to the (camera, box, frame index) it was read in
+        with self._lock:
+            if self._done:
+                return
+
+            for v in decoded_vals:
+                code, new = self.index.mark_found(v)
+                if self.store is not None:
+                    cam, box, fidx = where.get(v, (None, None, None)) if where else (None, None, None)
+                    self.store.record(self.order_id, v, code, new, cam, box, frame=fidx)
+                if code is None:
+                    self.metrics.inc("off_manifest_total")
+                #keyed on the manifest code, so a read that was off manifest
+                #still goes out once its carton line streams in
+                if not self._events.value(v, ("off", v) if code is None else code):
+                    continue
+                if code is not None:
+                    if new and self._pacer:
+                        self._pacer.note_new()
+                    self._events.log(f"{v} is loaded")
+                else:
+                    self._events.log(f"{v} not part of shipment")
+
+            #stays running for the next order, detect idles until set_manifest
+            #finished_all goes out from the run loop right after the last batch
+            if self.index.complete():
+                self._done = True
+                self._finished = True
+                self.completed_at = time.monotonic()
+                self._events.log("all codes scanned")
+
+    def _flush_events(self):
+        #run loop only, so every signal comes from one thread at a steady rate
+        finished = self._finished
+        values, lines = self._events.drain()
+        if not (values or lines or finished):
+            return
+        with self.metrics.time("signal_emit_seconds"), self.trace.span("emit", "ui", values=len(values), lines=len(lines)):
+            if values:
+                self.decoded.emit(values)
+            if lines:
+                self.log.emit("\n".join(lines))
+            if finished:
+                self._finished = False
+                self.finished_all.emit()
+
+    def _on_stage_error(self, name, err):
+        self._events.log(f"#{name} stage error: {err}")
 
     def run(self):
-        #lazy import stuff
+        #startup checks first, so a broken install says what broke
+        boot = current_bootstrap()
+        if boot is not None:
+            while not boot.wait(0.1):
+                if self._stop:
+                    return
+            for name, err in boot.failures():
+                self.log.emit(f"import fail: {name}: {err}")
+            if boot.failures():
+                return
+
+        #lazy import stuff, already loaded by the bootstrap when there is one
         try:
-            from ultralytics import YOLO
-            from PIL import Image, ImageOps
-            import gi
-            gi.require_version("Gst", "1.0")
-            from gi.repository import Gst
-            from pyzbar.pyzbar import decode as zbar_decode
             import numpy as np
+            from barcodeDecoders import CropDecodePool
+            from cameraSources import Gst, CameraSource, parse_cameras, CaptureManager
+            from scanPipeline import (DropQueue, Stage, FramePacer, FramePool,
+                                      gray_crop, scale_boxes, pad_boxes, downscale)
+            from scanTracking import BoxTracker, MotionGate, DecodeCache, dhash
+            sources = parse_cameras(self.cameras, self.cam_width, self.cam_height, self.cam_fps, self.realtime)
+            #image folders and python frames dont need gstreamer
+            if Gst is None and any(isinstance(s, CameraSource) for s in sources):
+                raise ImportError("gi / Gst not available")
         except Exception as e:
             self.log.emit(f"import fail: {e}")
             return
 
-        Gst.init(None)
-        pipeline_str = self._make_pipeline()
-        pipeline = Gst.parse_launch(pipeline_str)
-        appsink = pipeline.get_by_name("sink")
-        pipeline.set_state(Gst.State.PLAYING)
-
+        ncams = len(sources)
+        metrics = self.metrics
+        trace = self.trace
+
+        #frames live in pooled buffers, dropped ones go straight back to the pool
+        frame_slots = max(self.frame_queue_size, 2 * ncams, self.detect_batch)
+        pool = FramePool(keep=frame_slots + self.decode_queue_size + self.decode_workers + 2 * ncams)
+        self._pool = pool
+        frame_q = DropQueue(frame_slots, "frames", on_drop=lambda f: f.release(), block=self.lossless)
+        decode_q = DropQueue(self.decode_queue_size, "decode", on_drop=lambda job: job[0].release(), block=self.lossless)
+        pacer = FramePacer(self.frame_budget, self.idle_budget, self.idle_after)
+        self._pacer = pacer
+
+        #model is normally already warm from app startup, the camera only
+        #starts once it is so no frames stream into a dropped appsink
         self.log.emit("#oading yolo model...")
-        model = YOLO("my_model.pt")
+        det_h = int(round(self.cam_height * self.detect_width / self.cam_width)) if self.detect_width else self.cam_height
+        detector = warm_detector(
+            MODEL_PATH, self.detector_backend, self.detector_int8, self.detector_imgsz,
+            shape=(det_h, self.detect_width or self.cam_width, 3), batch=self.detect_batch,
+        )
+        while not detector.ready.wait(0.1):
+            if self._stop:
+                return
+        try:
+            model = detector.wait()
+        except Exception as e:
+            self.log.emit(f"model load fail: {e}")
+            return
+        self.log.emit(f"#detector {detector.path} (load {detector.load_s:.1f}s, warmup {detector.warm_s:.1f}s)")
 
-        total = len(self.codes)
-        self.log.emit(f"expecting {total} codes...")
+        total = len(self.index)
+        self.log.emit(f"expecting {total} codes from {ncams} camera(s)...")
 
-        while not self._stop:
-            #grab frame
-            sample = appsink.emit("pull-sample")
-            if sample is None:
-                time.sleep(self.fps_delay)
-                continue
-
-            buf = sample.get_buffer()
-            caps = sample.get_caps()
-            w = caps.get_structure(0).get_value("width")
-            h = caps.get_structure(0).get_value("height")
+        #one predict per batch, ultralytics expects bgr numpy
+        batcher = BatchScheduler(
+            lambda imgs: model.predict(imgs, imgsz=self.detector_imgsz, conf=0.25, iou=0.45, verbose=False),
+            self.detect_batch, self.detect_max_wait if ncams > 1 else 0,
+        )
+        self._batcher = batcher
 
-            ok, map_info = buf.map(Gst.MapFlags.READ)
-            if not ok:
-                time.sleep(self.fps_delay)
-                continue
+        crop_pool = CropDecodePool(
+            self.crop_pool, self.crop_workers,
+            chain=self.decoder_chain, budgets=self.decoder_budgets, total_ms=self.decode_budget_ms,
+            rectify=self.rectify, min_angle=self.rectify_min_angle,
+        )
+        self._crop_pool = crop_pool
+        if metrics.enabled or trace.enabled:
+            #crop_pool="process" decodes in worker processes, those crops go untimed
+            def on_crop(secs, vals):
+                metrics.observe("crop_decode_seconds", secs)
+                t1 = time.monotonic()
+                trace.add("crop decode", t1 - secs, t1, "decode", reads=len(vals))
+            crop_pool.chain.on_crop = on_crop
+        cache = DecodeCache(self.cache_ttl) if self.cache_ttl > 0 else None
+        self._cache = cache
+
+        #a bad camera spec or a camera that wont open lands here, not in the thread
+        capture = None
+        try:
+            capture = CaptureManager(
+                sources, pool, frame_q, pacer, on_error=self._on_stage_error, trace=trace,
+                mode=self.capture_mode, luma_format=self.luma_format,
+                detect_width=self.detect_width, pull_timeout=self.pull_timeout, metrics=metrics,
+            )
+            capture.start()
+        except Exception as e:
+            self.log.emit(f"camera fail: {e}")
+            if capture is not None:
+                capture.stop()
+            crop_pool.shutdown()
+            return
+        self._capture = capture
+        self.started_at = time.monotonic()
+        if boot is not None:
+            boot.mark("camera on")
+
+        #tracking state is per camera, boxes from one view mean nothing in another
+        trackers = [BoxTracker() for _ in sources]
+        gates = [MotionGate(self.motion_thresh) for _ in sources]
+        since_yolo = [0] * ncams
+
+        def detect(frame):
+            #between orders the camera keeps running but nothing gets detected
+            if self._done:
+                frame.release()
+                return
+            if self._reset:
+                self._reset = False
+                for cam in range(ncams):
+                    trackers[cam].reset()
+                    gates[cam].reset()
+                    since_yolo[cam] = 0
+                if cache is not None:
+                    cache.clear()
+
+            #frames from every camera that show up before the deadline share a predict
+            frames = batcher.gather(frame, frame_q)
+            with trace.span("detect", "detect", frames=len(frames)):
+                detect_frames(frames)
+
+        def detect_frames(frames):
+            yolo_frames = []
+            for f in frames:
+                #bgr mode shrinks on the cpu here, gray mode already got a small branch from gst
+                full_h, full_w = f.pixels.shape[:2]
+                if f.det is None and self.detect_width and full_w > self.detect_width:
+                    f.det = downscale(f.pixels, self.detect_width, pool)
+                    f.scale = (full_w / f.det.shape[1], full_h / f.det.shape[0])
+
+                cam = f.camera
+                small = f.detect_image()
+                use_yolo = (
+                    self.detect_every <= 1
+                    or since_yolo[cam] + 1 >= self.detect_every
+                    or not trackers[cam].tracks
+                    or gates[cam].moved(small)
+                )
+                if use_yolo:
+                    since_yolo[cam] = 0
+                    gates[cam].mark(small)
+                    yolo_frames.append(f)
+                else:
+                    #in between yolo frames, decode where the boxes should be by now
+                    since_yolo[cam] += 1
+                    queue_boxes(f, trackers[cam].predict(), self.roi_pad + self.track_pad)
+
+            if not yolo_frames:
+                return
+
+            with metrics.time("yolo_predict_seconds"), trace.span("yolo predict", "detect", batch=len(yolo_frames)):
+                results = batcher.predict([f.detect_image() for f in yolo_frames])
+            for f, res in zip(yolo_frames, results):
+                if res is not None and res.boxes is not None:
+                    raw = res.boxes.xyxy.cpu().numpy()
+                else:
+                    raw = np.zeros((0, 4), dtype=np.float32)
+                metrics.inc("detections_total", len(raw))
+                queue_boxes(f, trackers[f.camera].update(scale_boxes(raw, *f.scale)), self.roi_pad)
+
+        def queue_boxes(frame, tracked, pad):
+            if not tracked:
+                frame.release()
+                trace.frame_done(frame, "detect")
+                pacer.note_frame(0)
+                self._events.log("no barcodes read")
+                return
+
+            full_h, full_w = frame.pixels.shape[:2]
+            ids = [(frame.camera, tid) for tid, _ in tracked]
+            boxes = pad_boxes([b for _, b in tracked], pad, self.roi_pad_px, full_w, full_h)
+            pacer.note_frame(len(boxes))
+            decode_q.put((frame, boxes, ids))
+
+        def decode(job):
+            frame = job[0]
+            with trace.span("decode", "decode", camera=frame.camera, index=frame.index, crops=len(job[1])):
+                decode_frame(job)
+            trace.frame_done(frame)
+
+        def decode_frame(job):
+            frame, boxes, ids = job
+            frame_index = frame.index
+            decoded_vals = []
+            where = {}
+            cached = 0
 
-            frame = None
             try:
-                frame = np.frombuffer(map_info.data, dtype=np.uint8).reshape((h, w, 3))
+                todo = []
+                for box, tid in zip(boxes, ids):
+                    gray = gray_crop(frame.pixels, box)
+                    if gray is None:
+                        continue
+
+                    #label we already read, no zbar and no signals for it
+                    key = None
+                    if cache is not None:
+                        key = dhash(gray)
+                        if cache.lookup(tid, key, (tid[0], box), self.cache_hash) is not None:
+                            cached += 1
+                            continue
+                    todo.append((gray, tid, key, box))
+
+                results = crop_pool.decode_all([t[0] for t in todo])
             finally:
-                buf.unmap(map_info)
-
-            if frame is None:
-                time.sleep(self.fps_delay)
-                continue
-
-            #pillow rgb
-            img_rgb = Image.fromarray(frame[:, :, ::-1], mode="RGB")
-
-            #run yolo
-            res = model.predict(img_rgb, conf=0.25, iou=0.45, verbose=False)
-            if not res or res[0].boxes is None:
-                self.log.emit("no barcodes read")
-                time.sleep(self.fps_delay)
-                continue
-
-            boxes = res[0].boxes.xyxy.cpu().numpy().astype(int)
-            decoded_vals = []
-
-            for (x1, y1, x2, y2) in boxes:
-                crop = img_rgb.crop((x1, y1, x2, y2))
-                gray = ImageOps.grayscale(crop)
-                out = zbar_decode(gray)
-                for r in out:
-                    try:
-                        v = r.data.decode("utf-8", errors="ignore")
-                        if v not in decoded_vals:
-                            decoded_vals.append(v)
-                    except:
-                        pass
+                frame.release()
+
+            if cached:
+                metrics.inc("cache_hits_total", cached)
+            #merge back in box order
+            for (_, tid, key, box), crop_vals in zip(todo, results):
+                if not crop_vals:
+                    metrics.inc("misses_total")
+                    continue
+                metrics.inc("decodes_total", len(crop_vals))
+                if cache is not None:
+                    cache.store(crop_vals, tid, key, (tid[0], box))
+                for v in crop_vals:
+                    if v not in decoded_vals:
+                        decoded_vals.append(v)
+                        where[v] = (tid[0], box, frame_index)
 
             if decoded_vals:
-                for v in decoded_vals:
-                    self.decoded.emit(v)
-                    if v in self.codes:
-                        self._found.add(v)
-                        self.log.emit(f"{v} is loaded")
-                    else:
-                        self.log.emit(f"{v} not part of shipment")
-
-                if len(self._found) >= total:
-                    self.log.emit("all codes scanned")
-                    self.finished_all.emit()
-                    break
+                self._handle_values(decoded_vals, where)
+            elif not cached:
+                self._events.log("no barcodes read")
+
+        self._queues = [frame_q, decode_q]
+        self._stages = capture.stages + [
+            Stage("detect", detect, inbox=frame_q, on_error=self._on_stage_error),
+            Stage("decode", decode, inbox=decode_q, workers=self.decode_workers, on_error=self._on_stage_error),
+        ]
+        for st in self._stages[ncams:]:
+            st.start()
+
+        #this thread just babysits the stages and reports how they are doing
+        last_stats = last_ui = time.monotonic()
+        drained_since = None
+        while not self._stop:
+            time.sleep(min(0.05, self.ui_interval))
+            #manifest can finish streaming in after the last code was already read
+            if len(self.index) and self.index.complete() and not self._done:
+                self._handle_values([])
+            now = time.monotonic()
+            #recording ran out, give in flight crops a moment then stop
+            if self.stop_at_eos and capture.finished() and not len(frame_q) and not len(decode_q):
+                drained_since = drained_since or now
+                if now - drained_since > 0.5:
+                    self._stop = True
             else:
-                self.log.emit("no barcodes read")
+                drained_since = None
+            if now - last_ui >= self.ui_interval:
+                last_ui = now
+                self._flush_events()
+            if now - last_stats >= self.stats_every:
+                last_stats = now
+                if metrics.enabled:
+                    for q in self._queues:
+                        metrics.gauge("queue_depth", len(q), q.name)
+                    metrics.gauge("codes_found", self.index.found_count())
+                self.stats.emit(self.stage_stats())
+        self._flush_events()
+
+        capture.stop()
+        for st in self._stages[ncams:]:
+            st.stop()
+        for st in self._stages[ncams:]:
+            st.join(1.0)
+        crop_pool.shutdown()
+
+# ===================== manifest list =====================
+class RowCounts:
+    #fenwick tree of 0/1 per manifest position (1 = still unfound), so the
+    #row of a position and the position at a row are O(log n) either way
+    def __init__(self):
+        self.tree = [0]  #1 based
+        self.total = 0
+
+    def append(self, v):
+        #one more position at the end, its node also sums the ones it covers
+        self.total += v
+        i = len(self.tree)
+        j = i - 1
+        stop = i - (i & -i)
+        while j > stop:
+            v += self.tree[j]
+            j -= j & -j
+        self.tree.append(v)
+
+    def add(self, pos, d):
+        self.total += d
+        i = pos + 1
+        while i < len(self.tree):
+            self.tree[i] += d
+            i += i & -i
+
+    def before(self, pos):
+        #ones at positions < pos
+        n = 0
+        i = pos
+        while i > 0:
+            n += self.tree[i]
+            i -= i & -i
+        return n
+
+    def find(self, k):
+        #position of the k-th one (0 based)
+        pos = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(self.tree) and self.tree[nxt] <= k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+class ManifestListModel(QAbstractListModel):
+    #scan screen list straight off the manifest index, nothing per row but
+    #a found flag, so 10k+ codes cost the same as a few
+    #order: "manifest", "found_last" or "remaining", see LIST_ORDER.
+    #a hit only strikes its row out where it is (one row repaint, same as
+    #manifest order). moving found rows down / dropping them waits for
+    #reorder(), at most every reorder_ms, so a busy scan pays for the
+    #bigger update (remaining lays every row out again) once, not per batch.
+    #rows above the found ones are found via RowCounts, O(log n) per hit
+    def __init__(self, index, order="manifest", parent=None, reorder_ms=1000):
+        super().__init__(parent)
+        self.manifest = index  #not .index, that is the qt model method
+        self.order = order
+        self.marked = bytearray()  #1 per code once the list shows it found
+        self.marked_count = 0
+        self._unfound = None if order == "manifest" else RowCounts()  #1 = still in the top rows
+        self._found = []     #found_last, moved down while scanning, oldest first
+        self._restored = []  #found_last, came in already found, below the rest
+        self._pending = []   #marked but not moved yet
+
+        self._reorder_timer = QTimer(self)
+        self._reorder_timer.setSingleShot(True)
+        self._reorder_timer.setInterval(reorder_ms)
+        self._reorder_timer.timeout.connect(self.reorder)
+
+        self._font = QFont()
+        self._font.setPointSize(14)
+        self._struck = QFont(self._font)
+        self._struck.setStrikeOut(True)
+        self._gray = QBrush(QColor(150, 150, 150))
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self._unfound is None:
+            return len(self.marked)
+        return self._unfound.total + len(self._found) + len(self._restored)
+
+    def position(self, row):
+        #manifest position shown at row
+        if self._unfound is None:
+            return row
+        split = self._unfound.total
+        if row < split:
+            return self._unfound.find(row)
+        k = row - split
+        if k < len(self._found):
+            return self._found[-1 - k]  #newest first
+        return self._restored[k - len(self._found)]
+
+    def data(self, mi, role=Qt.DisplayRole):
+        if not mi.isValid():
+            return None
+        if role not in (Qt.DisplayRole, Qt.FontRole, Qt.ForegroundRole):
+            return None
+        pos = self.position(mi.row())
+        if role == Qt.DisplayRole:
+            return self.manifest.codes[pos]
+        if role == Qt.FontRole:
+            return self._struck if self.marked[pos] else self._font
+        return self._gray if self.marked[pos] else None
+
+    def add_codes(self, start, end):
+        #manifest positions start..end showed up (streaming load), codes
+        #already found in a recovered order come in marked
+        found = self.manifest.found
+        start = max(start, len(self.marked))
+        end = min(end, len(found))
+        if end <= start:
+            return
+        new = bytearray(found[start:end])
+        if self._unfound is None:
+            self.beginInsertRows(QModelIndex(), start, end - 1)
+            self.marked.extend(new)
+            self.marked_count += sum(new)
+            self.endInsertRows()
+            return
 
-            time.sleep(self.fps_delay)
+        #new positions are the highest so far, unfound ones go right after
+        #the other unfound rows
+        todo = len(new) - sum(new)
+        at = self._unfound.total
+        if todo:
+            self.beginInsertRows(QModelIndex(), at, at + todo - 1)
+        self.marked.extend(new)
+        self.marked_count += len(new) - todo
+        for f in new:
+            self._unfound.append(0 if f else 1)
+        if todo:
+            self.endInsertRows()
+        done = [p for p in range(start, end) if new[p - start]]
+        if done and self.order == "found_last":
+            at = self.rowCount()
+            self.beginInsertRows(QModelIndex(), at, at + len(done) - 1)
+            self._restored.extend(done)
+            self.endInsertRows()
+
+    def mark(self, positions):
+        #positions the worker found, returns the ones that were new to the list
+        new = sorted({p for p in positions if p < len(self.marked) and not self.marked[p]})
+        for p in new:
+            self.marked[p] = 1
+        self.marked_count += len(new)
+        if not new:
+            return new
+
+        if self._unfound is None:
+            rows = new
+        else:
+            #still in manifest order up top until the next reorder
+            rows = [self._unfound.before(p) for p in new]
+            self._pending.extend(new)
+            if not self._reorder_timer.isActive():
+                self._reorder_timer.start()
+
+        #one dataChanged per run of neighbouring rows
+        roles = [Qt.FontRole, Qt.ForegroundRole]
+        first = prev = rows[0]
+        for r in rows[1:] + [None]:
+            if r is not None and r == prev + 1:
+                prev = r
+                continue
+            self.dataChanged.emit(self.createIndex(first, 0), self.createIndex(prev, 0), roles)
+            first = prev = r
+        return new
+
+    def reorder(self):
+        #found rows marked since the last call go below the unfound ones
+        #(found_last) or off the list (remaining)
+        self._reorder_timer.stop()
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        if self.order == "found_last":
+            #rows from the first hit down to the old split all show something
+            #else now, the row count stays the same so no new layout
+            first = self._unfound.before(min(pending))
+            last = self._unfound.total - 1
+            for p in pending:
+                self._unfound.add(p, -1)
+                self._found.append(p)
+            self.dataChanged.emit(self.createIndex(first, 0), self.createIndex(last, 0))
+            return
 
-        pipeline.set_state(Gst.State.NULL)
+        #the view lays out once after all of these, not once per row
+        for p in sorted(pending, reverse=True):
+            r = self._unfound.before(p)
+            self.beginRemoveRows(QModelIndex(), r, r)
+            self._unfound.add(p, -1)
+            self.endRemoveRows()
+
+def manifest_list_view(model):
+    #flat list of the model, uniform rows so a dataChanged only repaints
+    #what is on screen
+    view = QTreeView()
+    view.setModel(model)
+    view.setUniformRowHeights(True)
+    view.setHeaderHidden(True)
+    view.setRootIsDecorated(False)
+    view.setSelectionMode(QAbstractItemView.NoSelection)
+    view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    view.setFocusPolicy(Qt.NoFocus)  #no current row highlight
+    return view
+
+# ===================== scan screen widgets =====================
+class GlitchTitle(QLabel):
+    #big title with a red/cyan offset copy behind it
+    def __init__(self, text, parent=None):
+        super().__init__(text, parent)
+        self.setAlignment(Qt.AlignCenter)
+        self.setFont(QFont("Arial", 40, QFont.Bold))
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        p.setFont(self.font())
+        for dx, color in ((-3, QColor(255, 0, 80)), (3, QColor(0, 230, 255)), (0, QColor(255, 255, 255))):
+            p.setPen(color)
+            p.drawText(self.rect().translated(dx, 0), self.alignment(), self.text())
+        p.end()
+
+class RoundedPanel(QFrame):
+    #white card the scanned list sits in
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("roundedPanel")
+        self.setStyleSheet("#roundedPanel { background-color:#ffffff; border-radius:24px; }")
+
+class ScanBubble(QLabel):
+    #last scanned code
+    def __init__(self, parent=None):
+        super().__init__("waiting for the first scan", parent)
+        self.setAlignment(Qt.AlignCenter)
+        self.setWordWrap(True)
+        self.setMinimumHeight(120)
+        self.setFont(QFont("Arial", 20, QFont.Bold))
+        self.setStyleSheet("color:#000000; background-color:#00e6ff; border-radius:30px; padding:16px;")
+
+class PillProgressBar(QProgressBar):
+    #rounded bar, the percent is its own label under it
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setRange(0, 100)
+        self.setTextVisible(False)
+        self.setStyleSheet("""
+            QProgressBar { background-color:#333333; border:0px; border-radius:20px; }
+            QProgressBar::chunk { background-color:#00e6ff; border-radius:20px; }
+        """)
 
 # ===================== scan screen =====================
 class scanScreen(QWidget):
     scan_complete = pyqtSignal(int, datetime, datetime)
+    codes_added = pyqtSignal(int, int)  # manifest loader thread -> list
 
-    def __init__(self, manifest):
+    def __init__(self, manifest, worker=None):
         super().__init__()
 
-        # manifest + tracking
+        # manifest + tracking, the index is shared with the worker
         self.start_time = datetime.now()
-        self.manifest = list(manifest)
-        self.expected = list(manifest)
-        self.found = set()
+        if isinstance(manifest, ManifestIndex):
+            self.index = manifest
+        else:
+            self.index = ManifestIndex(manifest, **MANIFEST_RULES)
+        self.log_lines = deque(maxlen=500)  # recent worker log, ring buffer
 
         # core UI
         self.setStyleSheet("background-color:black;")
@@ -269,24 +949,22 @@ class scanScreen(QWidget):
         panel_lay = QVBoxLayout(self.panel)
         panel_lay.setContentsMargins(24, 24, 24, 24)
 
-        self.list = QListWidget()
-        self.list.setSelectionMode(QListWidget.NoSelection)
+        # model/view list, rows are painted straight from the manifest index
+        # so only what is on screen costs anything. a batch of hits is about
+        # 0.1 ms at 10k-50k codes in every LIST_ORDER, see benchMicro.py list.
+        # a tree view set up as a flat list: qlistview lays out every row
+        # again on any dataChanged, this one only repaints the changed rows
+        self.model = ManifestListModel(self.index, LIST_ORDER, self)
+        self.list = manifest_list_view(self.model)
         self.list.setStyleSheet("""
-            QListWidget { background-color:#ffffff; border:0px; color:#000000; }
-            QListWidget::item { padding:4px; }
+            QTreeView { background-color:#ffffff; border:0px; color:#000000; }
+            QTreeView::item { padding:4px; }
         """)
         panel_lay.addWidget(self.list)
         right.addWidget(self.panel)
 
-        # fill list with manifest items
-        self.items = {}
-        for code in self.expected:
-            item = QListWidgetItem(code)
-            f = item.font()
-            f.setPointSize(14)
-            item.setFont(f)
-            self.list.addItem(item)
-            self.items[code] = item
+        # more codes show up while the manifest streams in
+        self.codes_added.connect(self._addCodes)
 
         # ================= LEFT COLUMN (bubble + progress) =================
         left = QVBoxLayout()
@@ -321,40 +999,106 @@ class scanScreen(QWidget):
             self.logo.setPixmap(pm.scaled(96, 96, Qt.KeepAspectRatio, Qt.SmoothTransformation))
         left.addWidget(self.logo, alignment=Qt.AlignLeft | Qt.AlignBottom)
 
+        self._addCodes(0, len(self.index))
+
         # ================= BARCODE WORKER =================
-        self.worker = barcodeReader(self.manifest)
+        # the session engine passes its long running reader in, otherwise
+        # this screen runs (and owns) its own
+        self._owns_worker = worker is None
+        self.worker = worker if worker is not None else barcodeReader(self.index)
         self.worker.log.connect(self._log)
         self.worker.decoded.connect(self._handleDecoded)
         self.worker.finished_all.connect(self._onDone)
-        self.worker.start()
-
-    # debug log (optional to keep)
+        if self._owns_worker:
+            self.worker.start()
+
+        # ================= DEBUG OVERLAY =================
+        # F3 shows the worker's stage timers + counters on top of everything
+        self.overlay = QLabel(self)
+        self.overlay.setFont(QFont("Monospace", 11))
+        self.overlay.setStyleSheet("color:#7CFC00; background-color:rgba(0,0,0,190); padding:8px;")
+        self.overlay.hide()
+        self.overlay_timer = QTimer(self)
+        self.overlay_timer.timeout.connect(self._refreshOverlay)
+        QShortcut(QKeySequence("F3"), self, self._toggleOverlay)
+        QShortcut(QKeySequence("F4"), self, self._dumpTrace)
+
+    def _toggleOverlay(self):
+        if self.overlay.isVisible():
+            self.overlay_timer.stop()
+            self.overlay.hide()
+            return
+        self._refreshOverlay()
+        self.overlay.show()
+        self.overlay.raise_()
+        self.overlay_timer.start(500)
+
+    def _refreshOverlay(self):
+        self.overlay.setText("\n".join(self.worker.metrics.summary_lines()))
+        self.overlay.adjustSize()
+        self.overlay.move(10, 10)
+
+    # write the worker's recent trace spans to disk
+    def _dumpTrace(self):
+        if not self.worker.trace.enabled:
+            self._log("tracing off, start with TRACE=1")
+            return
+        try:
+            path = self.worker.trace.dump()
+        except OSError as e:
+            self._log(f"trace dump fail: {e}")
+            return
+        print(f"trace dumped: {path}")
+        self._log(f"trace dumped: {path}")
+
+    # unhook from a shared reader before the screen goes away
+    def detach(self):
+        self.overlay_timer.stop()
+        self.worker.log.disconnect(self._log)
+        self.worker.decoded.disconnect(self._handleDecoded)
+        self.worker.finished_all.disconnect(self._onDone)
+        if self._owns_worker:
+            self.worker.stop()
+            self.worker.wait(3000)
+
+    # new manifest codes (positions start..end in the index), codes already
+    # found in a recovered order come in struck out
+    def _addCodes(self, start, end):
+        self.model.add_codes(start, end)
+        self._updateProgress()
+
+    def _updateProgress(self):
+        pct = int((self.model.marked_count / len(self.index)) * 100) if len(self.index) else 0
+        self.progress.setValue(pct)
+        self.percent.setText(f"{pct}%")
+
+    # debug log, the box is visually removed but the last lines are kept
     def _log(self, msg):
-        pass  # your v003 log box is visually removed here
-
-    # when a barcode is decoded
-    def _handleDecoded(self, code):
-        if code in self.expected and code not in self.found:
-            self.found.add(code)
-            self.bubble.setText(f"{code} was scanned")
-
-            # strike through and gray-out
-            item = self.items.get(code)
-            if item:
-                f = item.font()
-                f.setStrikeOut(True)
-                item.setFont(f)
-                item.setForeground(QColor(150, 150, 150))
-
-            # update progress
-            pct = int((len(self.found) / len(self.expected)) * 100) if self.expected else 0
-            self.progress.setValue(pct)
-            self.percent.setText(f"{pct}%")
+        self.log_lines.extend(msg.split("\n"))
+
+    # a batch of decoded values from the worker
+    def _handleDecoded(self, values):
+        with self.worker.trace.span("ui update", "ui", values=len(values)):
+            self._applyDecoded(values)
+
+    def _applyDecoded(self, values):
+        # manifest positions of the reads, the model strikes them out
+        # with one ranged update and says which ones are new
+        positions = [self.index.position(raw) for raw in values]
+        new = self.model.mark([p for p in positions if p is not None])
+
+        # one bubble + progress update per batch
+        if new:
+            last = next(p for p in reversed(positions) if p in new)
+            self.bubble.setText(f"{self.index.codes[last]} was scanned")
+            self._updateProgress()
 
     # once all manifest codes are found
     def _onDone(self):
         end = datetime.now()
-        total = len(self.manifest)
+        total = self.index.found_count()
+        if self._owns_worker:
+            self.worker.stop()
         self.scan_complete.emit(total, self.start_time, end)
 
 # ===================== main window =====================
@@ -364,24 +1108,125 @@ class MainWindow(QStackedWidget):
         self.setWindowTitle("final project")
         self.showFullScreen()  #full screen like you wanted
 
-        #load manifest
-        manifest = load_manifest()
+        #imports, checks and the model load + warmup all run while the window
+        #comes up, the warm model is kept for every order
+        self.boot = start_bootstrap(
+            cameras=CAMERAS, backend=DETECTOR_BACKEND, int8=DETECTOR_INT8, batch=4,
+            on_done=lambda boot: print(boot.report()), done_mark="camera on",
+        )
+        QTimer.singleShot(0, lambda: self.boot.mark("window shown"))
+
+        #orders for this shift, more can be added to the queue while scanning
+        self.orders = OrderQueue(load_orders(ORDERS_PATH) if ORDERS_PATH else ())
+        self.order = None
 
-        #create screens
-        self.scan = ScanScreen(manifest)
+        #view order screen lives the whole time, scan screens come and go,
+        #one reader (camera + model + decoder pool) serves every order
         self.view = ViewOrderScreen()
+        self.view.next_order.connect(self._next_order)
+        self.addWidget(self.view)
 
+        #every decode goes to disk, an order still open from a crash resumes
+        try:
+            self.store = EventStore(DB_PATH)
+        except Exception as e:
+            print(f"event store fail: {e}")
+            self.store = None
+
+        self.reader = None
+        self.scan = None
+        self.loader = None
+        self.metrics_server = None
+        self._next_order()
+
+    def _next_order(self):
+        #no execv, the next manifest goes into the running reader
+        self._end_order()
+        order = self.orders.next() or Order(manifest_path(), TRAILER, DOCK_DOOR)
+        self.order = order
+
+        #stream the manifest in, scanning starts before it finishes loading
+        manifest = ManifestIndex(**MANIFEST_RULES)
+        manifest.loading = True
+        order.index = manifest
+        self._open_order(order)
+
+        if self.reader is None:
+            self.reader = barcodeReader(manifest)
+            self.reader.store = self.store
+            self.reader.order_id = order.order_id
+            if METRICS_PORT:
+                try:
+                    self.metrics_server = serve_metrics(self.reader.metrics, METRICS_PORT)
+                    print(f"metrics on http://127.0.0.1:{self.metrics_server.port}/metrics")
+                except OSError as e:
+                    print(f"metrics endpoint fail: {e}")
+            self.reader.start()
+        else:
+            self.reader.set_manifest(manifest, order.order_id)
+
+        self.scan = scanScreen(manifest, self.reader)
+        if order.start_time:
+            self.scan.start_time = order.start_time
         self.scan.scan_complete.connect(self._on_scan_done)
+        self.insertWidget(0, self.scan)
 
-        self.addWidget(self.scan)
-        self.addWidget(self.view)
+        self.loader = ManifestLoader(manifest, order.manifest, order.fmt, on_added=self.scan.codes_added.emit)
+        self.loader.start()
+
+        self.view.set_queued(len(self.orders))
+        self.setCurrentWidget(self.scan)
 
-        self.setCurrentIndex(0)
+    def _open_order(self, order):
+        #picks up the found set of the same order left open by a crash
+        if self.store is None:
+            return
+        try:
+            prev = self.store.find_open(order.manifest, order.trailer)
+            if prev is not None:
+                order.order_id = prev["id"]
+                order.start_time = datetime.fromtimestamp(prev["started"])
+                order.index.restore_found(self.store.found_codes(prev["id"]))
+            else:
+                order.order_id = self.store.open_order(order.manifest, order.trailer, order.dock_door)
+        except Exception as e:
+            print(f"event store fail: {e}")
+
+    def _end_order(self):
+        if self.loader is not None:
+            #its last read after stop() must not signal a screen thats going away
+            self.loader.on_added = None
+            self.loader.stop()
+            self.loader.join(1.0)
+            self.loader = None
+        if self.scan is not None:
+            self.scan.detach()
+            self.removeWidget(self.scan)
+            self.scan.deleteLater()
+            self.scan = None
 
     def _on_scan_done(self, count, start, end):
         #casual: when done, add row + switch screens
-        self.view.add_order(start, end, count)
-        self.setCurrentIndex(1)
+        order = self.order
+        order.start_time, order.end_time, order.scanned = start, end, count
+        order.resolve()
+        if self.store is not None and order.order_id is not None:
+            self.store.update_order(order.order_id, order.trailer, order.dock_door)
+            self.store.close_order(order.order_id, count, len(order.index), ended=end.timestamp())
+        self.view.add_order(start, end, count, order.trailer, order.dock_door)
+        self.view.set_queued(len(self.orders))
+        self.setCurrentWidget(self.view)
+
+    def closeEvent(self, event):
+        self._end_order()
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader.wait(3000)
+        if self.store is not None:
+            self.store.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        super().closeEvent(event)
 
 # ===================== entry =====================
 if __name__ == "__main__":
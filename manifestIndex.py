@@ -0,0 +1,348 @@
+'''
+manifest index shared by the reader, the scan screen and the summary
+hashed lookup on a normalized key so matching a read is O(1) no matter how
+many cartons are on the trailer, plus the found state for every code.
+the loader streams txt/csv/json manifests into an index line by line and
+keeps watching the file so appended cartons show up while scanning
+'''
+
+import os, re, csv, json, threading
+
+#symbology ids some scanners/decoders put in front, eg ]C1 for gs1-128
+_SYM_ID = re.compile(r"^\][A-Za-z][0-9A-Za-z]")
+#(00) sscc / (01) gtin written with brackets
+_AI_BRACKET = re.compile(r"^\((00|01)\)")
+#bare ai + fixed length payload
+_AI_BARE = {"00": 18, "01": 14}
+
+#ean-8, upc-a, ean-13, gtin-14, sscc
+GS1_LENGTHS = (8, 12, 13, 14, 18)
+
+def gs1_check_ok(digits):
+    #mod 10 check digit used by ean/upc/itf/sscc
+    if not digits.isdigit() or len(digits) < 2:
+        return False
+    body, check = digits[:-1], int(digits[-1])
+    total = 0
+    for i, d in enumerate(reversed(body)):
+        total += int(d) * (3 if i % 2 == 0 else 1)
+    return (10 - total % 10) % 10 == check
+
+class ManifestIndex:
+    #upper: ignore case
+    #gs1: drop symbology ids, fnc1/gs chars and a leading (00)/(01) ai
+    #strip_zeros: 00012345 and 12345 are the same carton
+    #check_digit_optional: a gs1 length read (8/12/13/14/18 digits) with a
+    #valid trailing check digit also matches a manifest entry written without
+    #it. off by default, 1 in 10 random numeric reads pass the check
+    def __init__(self, codes=(), upper=True, gs1=True, strip_zeros=False, check_digit_optional=False):
+        self.upper = upper
+        self.gs1 = gs1
+        self.strip_zeros = strip_zeros
+        self.check_digit_optional = check_digit_optional
+
+        self.codes = []           #manifest codes as written, in manifest order
+        self.found = bytearray()  #1 per code once its been scanned
+        self.meta = {}            #position -> per carton info (trailer, dock_door, sku...)
+        self.info = {}            #manifest wide info from the file, if any
+        self.loading = False      #set while a loader is still streaming the file in
+        self._by_key = {}         #normalized key -> position in codes
+        self._restore = set()     #keys found in a recovered order, not loaded yet
+        self._found_count = 0
+        self._lock = threading.Lock()
+
+        for c in codes:
+            self.add(c)
+
+    def normalize(self, raw):
+        v = raw.strip()
+        if self.gs1:
+            v = _SYM_ID.sub("", v).replace("\x1d", "")
+            m = _AI_BRACKET.match(v)
+            if m:
+                v = v[m.end():]
+            elif v.isdigit() and _AI_BARE.get(v[:2]) == len(v) - 2:
+                v = v[2:]
+        if self.upper:
+            v = v.upper()
+        if self.strip_zeros:
+            v = v.lstrip("0") or "0"
+        return v
+
+    def add(self, code, meta=None):
+        #position of the code, None for blanks and duplicates
+        code = code.strip()
+        if not code:
+            return None
+        key = self.normalize(code)
+        with self._lock:
+            if key in self._by_key:
+                return None
+            pos = len(self.codes)
+            self._by_key[key] = pos
+            self.codes.append(code)
+            if key in self._restore:
+                self._restore.discard(key)
+                self.found.append(1)
+                self._found_count += 1
+            else:
+                self.found.append(0)
+            if meta:
+                self.meta[pos] = meta
+            return pos
+
+    def position(self, raw):
+        key = self.normalize(raw)
+        pos = self._by_key.get(key)
+        if pos is None and self.check_digit_optional and len(key) in GS1_LENGTHS and gs1_check_ok(key):
+            pos = self._by_key.get(key[:-1])
+        return pos
+
+    def match(self, raw):
+        #manifest code a read belongs to, or None if its not on this shipment
+        pos = self.position(raw)
+        return None if pos is None else self.codes[pos]
+
+    def mark_found(self, raw):
+        #(manifest code, first time seen), (None, False) for off manifest reads
+        pos = self.position(raw)
+        if pos is None:
+            return None, False
+        with self._lock:
+            new = not self.found[pos]
+            if new:
+                self.found[pos] = 1
+                self._found_count += 1
+        return self.codes[pos], new
+
+    def restore_found(self, codes):
+        #found set of a recovered order, codes still streaming in get
+        #marked as soon as the loader adds them
+        for code in codes:
+            if self.position(code) is not None:
+                self.mark_found(code)
+            else:
+                with self._lock:
+                    self._restore.add(self.normalize(code))
+
+    def found_count(self):
+        return self._found_count
+
+    def complete(self):
+        #never complete while the manifest is still coming in
+        return not self.loading and self._found_count >= len(self.codes)
+
+    def remaining(self):
+        return [c for c, f in zip(self.codes, self.found) if not f]
+
+    def __contains__(self, raw):
+        return self.position(raw) is not None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return iter(list(self.codes))
+
+# ===================== manifest files =====================
+#csv/json field names that hold the carton code, first match wins
+CODE_FIELDS = ("code", "barcode", "carton", "sscc", "gtin", "upc")
+#other spellings folded onto the names the rest of the app uses
+FIELD_ALIASES = {"door": "dock_door", "dockdoor": "dock_door", "dock door": "dock_door", "trailer_id": "trailer"}
+
+def manifest_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".json":
+        return "json"
+    return "txt"
+
+def _clean_fields(row):
+    out = {}
+    for k, v in row.items():
+        if k is None or v in (None, ""):
+            continue
+        k = str(k).strip().lower()
+        out[FIELD_ALIASES.get(k, k)] = v.strip() if isinstance(v, str) else v
+    return out
+
+def _split_carton(row):
+    #(code, meta) out of one csv/json record
+    if not isinstance(row, dict):
+        return str(row), {}
+    row = _clean_fields(row)
+    for f in CODE_FIELDS:
+        if f in row:
+            code = str(row.pop(f))
+            return code, row
+    return None, row
+
+class _LineParser:
+    #turns manifest lines into (code, meta), remembers the csv header
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.header = None
+
+    def parse(self, line):
+        line = line.strip()
+        if not line:
+            return []
+        if self.fmt == "txt":
+            return [(p, {}) for p in line.split()]
+        if self.fmt == "jsonl":
+            try:
+                code, meta = _split_carton(json.loads(line))
+            except ValueError:
+                return []
+            return [(code, meta)] if code else []
+
+        #csv, a first row naming a code column is the header
+        cells = next(csv.reader([line]))
+        if self.header is None:
+            names = [c.strip().lower() for c in cells]
+            if any(n in CODE_FIELDS for n in names):
+                self.header = names
+                return []
+            self.header = []
+        if not self.header:
+            return [(cells[0], {})] if cells else []
+        code, meta = _split_carton(dict(zip(self.header, cells)))
+        return [(code, meta)] if code else []
+
+def iter_manifest(path, fmt=None):
+    #(code, meta) pairs streamed out of a manifest file
+    fmt = fmt or manifest_format(path)
+    if fmt == "json":
+        for code, meta in _read_json(path)[0]:
+            yield code, meta
+        return
+    parser = _LineParser(fmt)
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            for item in parser.parse(line):
+                yield item
+
+def _read_json(path):
+    #json cant be streamed with the stdlib so it gets read whole
+    #either a list of cartons or {"cartons": [...], "trailer": ..., ...}
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        doc = json.load(f)
+    info = {}
+    rows = doc
+    if isinstance(doc, dict):
+        rows = doc.get("cartons") or doc.get("codes") or []
+        info = _clean_fields({k: v for k, v in doc.items() if not isinstance(v, (list, dict))})
+    out = []
+    for row in rows:
+        code, meta = _split_carton(row)
+        if code:
+            out.append((code, meta))
+    return out, info
+
+class ManifestLoader(threading.Thread):
+    #streams a manifest file into an index, then polls it for appends
+    #on_added(start, end) gets called with the new index positions in
+    #batches, on the loader thread
+    def __init__(self, index, path, fmt=None, watch=True, poll=1.0, batch=500, on_added=None):
+        super().__init__(daemon=True, name="manifest-loader")
+        self.index = index
+        self.path = path
+        self.fmt = fmt or manifest_format(path)
+        self.watch = watch
+        self.poll = poll
+        self.batch = batch
+        self.on_added = on_added
+        self.loaded = threading.Event()
+        self._halt = threading.Event()
+        self._parser = _LineParser(self.fmt)
+        self._offset = 0
+        self._stat = None
+
+    def stop(self):
+        self._halt.set()
+
+    def run(self):
+        self.index.loading = True
+        try:
+            if os.path.exists(self.path):
+                self._read_new(final=True)
+            else:
+                print("manifest missing, making empty list")
+        finally:
+            self.index.loading = False
+            self.loaded.set()
+
+        while self.watch and not self._halt.wait(self.poll):
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                continue
+            sig = (st.st_mtime_ns, st.st_size)
+            if sig == self._stat:
+                continue
+            if st.st_size < self._offset:
+                #file got rewritten, start over, the index skips codes it has
+                self._offset = 0
+                self._parser = _LineParser(self.fmt)
+            self._read_new()
+
+        #stopped, the writer is done by now so a last line with no newline counts
+        if self.watch and os.path.exists(self.path):
+            self._read_new(final=True)
+
+    def _add(self, items, pending):
+        for code, meta in items:
+            pos = self.index.add(code, meta)
+            if pos is None:
+                continue
+            if pending[0] is None:
+                pending[0] = pos
+            pending[1] = pos + 1
+            if pending[1] - pending[0] >= self.batch:
+                self._flush(pending)
+
+    def _flush(self, pending):
+        if pending[0] is not None and self.on_added:
+            self.on_added(pending[0], pending[1])
+        pending[0] = pending[1] = None
+
+    def _parse_lines(self, data, pending):
+        for line in data.decode("utf-8", errors="ignore").splitlines():
+            self._add(self._parser.parse(line), pending)
+
+    def _read_new(self, final=False):
+        pending = [None, None]
+        try:
+            st = os.stat(self.path)
+            self._stat = (st.st_mtime_ns, st.st_size)
+            if self.fmt == "json":
+                rows, info = _read_json(self.path)
+                self.index.info.update(info)
+                self._add(rows, pending)
+                return
+
+            #offset only moves past whole lines. a last line with no newline is
+            #left for the next poll, it could be half an append (CC of CCCC).
+            #the first load and the one after stop() take it as is, a hand made
+            #manifest often just has no newline at the end
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                tail = b""
+                while final or not self._halt.is_set():
+                    chunk = f.read(1 << 16)
+                    if not chunk:
+                        break
+                    data = tail + chunk
+                    cut = data.rfind(b"\n") + 1
+                    tail = data[cut:]
+                    self._offset += cut
+                    self._parse_lines(data[:cut], pending)
+                if tail and final:
+                    self._parse_lines(tail, pending)
+        except (OSError, ValueError) as e:
+            print(f"manifest read fail: {e}")
+        finally:
+            self._flush(pending)
@@ -0,0 +1,214 @@
+'''
+startup bootstrap for the barcode reader
+the heavy imports (numpy, pil, gst, pyzbar, ultralytics/torch) each get a
+thread and run while the qt window paints, then every piece is checked
+(gst elements for the cameras, the zbar library, the model file) so a
+broken install shows up before scanning instead of as one log line.
+prints a per phase timing report to track cold start on the jetson
+
+    python scanBootstrap.py [cameras]    checks only, exit code 1 on a failure
+'''
+
+import os, sys, time, threading
+
+#as close to process start as we get, everything is reported from here
+T0 = time.perf_counter()
+
+#gst elements every pipeline uses, plus the ones a camera kind needs
+GST_COMMON = ("appsink", "tee", "queue", "videoconvert", "videoscale")
+GST_BY_KIND = {
+    "csi": ("nvarguscamerasrc", "nvvidconv"),
+    "file": ("filesrc", "decodebin"),
+    "test": ("videotestsrc",),
+}
+
+def _ms(t):
+    return (t - T0) * 1000
+
+class Phase:
+    def __init__(self, name, fn, after=()):
+        self.name = name
+        self.fn = fn
+        self.after = after
+        self.start = None
+        self.end = None
+        self.error = None
+        self.detail = ""
+        self.done = threading.Event()
+
+    def ok(self):
+        return self.done.is_set() and self.error is None
+
+# ===================== bootstrap =====================
+class Bootstrap:
+    #runs every phase on its own thread, phases wait for the ones in after
+    #on_done gets called once the checks are done, or with done_mark once
+    #that mark is in too (the report then has eg time to camera on). a failed
+    #check calls it right away, the mark wont come
+    def __init__(self, on_done=None, done_mark=None):
+        self.phases = {}
+        self.marks = []
+        self.on_done = on_done
+        self.done_mark = done_mark
+        self.finished = threading.Event()
+        self._called = False
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, after=()):
+        #fn returns an optional detail string, raises on failure
+        self.phases[name] = Phase(name, fn, after)
+
+    def mark(self, name):
+        #point in time worth reporting (window shown, scanning started...)
+        with self._lock:
+            self.marks.append((name, time.perf_counter()))
+        self._maybe_done()
+
+    def start(self):
+        for ph in self.phases.values():
+            threading.Thread(target=self._run, args=(ph,), daemon=True, name=f"boot-{ph.name}").start()
+        threading.Thread(target=self._finish, daemon=True, name="boot-finish").start()
+        return self
+
+    def _run(self, ph):
+        try:
+            for dep in ph.after:
+                dep = self.phases[dep]
+                dep.done.wait()
+                if dep.error is not None:
+                    raise RuntimeError(f"needs {dep.name}")
+            ph.start = time.perf_counter()
+            ph.detail = ph.fn() or ""
+        except Exception as e:
+            ph.error = e
+        finally:
+            if ph.start is None:
+                ph.start = time.perf_counter()
+            ph.end = time.perf_counter()
+            ph.done.set()
+
+    def _finish(self):
+        for ph in self.phases.values():
+            ph.done.wait()
+        with self._lock:
+            self.marks.append(("checks done", time.perf_counter()))
+        self.finished.set()
+        self._maybe_done()
+
+    def _maybe_done(self):
+        with self._lock:
+            if self._called or not self.on_done or not self.finished.is_set():
+                return
+            if self.done_mark and not self.failures() and self.done_mark not in (n for n, _ in self.marks):
+                return
+            self._called = True
+        self.on_done(self)
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def failures(self):
+        return [(ph.name, ph.error) for ph in self.phases.values() if ph.error is not None]
+
+    def ok(self):
+        return self.finished.is_set() and not self.failures()
+
+    def report(self):
+        lines = ["startup (ms since launch)", f"  {'phase':<14}{'start':>8}{'took':>8}  status"]
+        for ph in sorted(self.phases.values(), key=lambda p: p.start or 0):
+            if ph.end is None:
+                lines.append(f"  {ph.name:<14}{'':>8}{'':>8}  running")
+                continue
+            status = "ok" if ph.error is None else f"FAIL {ph.error}"
+            if ph.detail:
+                status += f" ({ph.detail})"
+            lines.append(f"  {ph.name:<14}{_ms(ph.start):8.0f}{(ph.end - ph.start) * 1000:8.0f}  {status}")
+        with self._lock:
+            marks = list(self.marks)
+        for name, t in marks:
+            lines.append(f"  {name:<14}{_ms(t):8.0f}")
+        return "\n".join(lines)
+
+# ===================== checks =====================
+def _numpy():
+    import numpy
+    return numpy.__version__
+
+def _pil():
+    import PIL
+    from PIL import Image
+    return PIL.__version__
+
+def _gst_fn(cameras):
+    def gst():
+        kinds = {(c.strip().partition(":")[0] or "csi") for c in cameras.split(",") if c.strip()}
+        if kinds and kinds <= {"dir"}:
+            return "not needed"
+        import gi
+        gi.require_version("Gst", "1.0")
+        from gi.repository import Gst
+        Gst.init(None)
+        need = list(GST_COMMON)
+        for k in sorted(kinds):
+            need.extend(GST_BY_KIND.get(k, ()))
+        missing = [e for e in need if Gst.ElementFactory.find(e) is None]
+        if missing:
+            raise RuntimeError("missing gst elements: " + ", ".join(missing))
+        return Gst.version_string()
+    return gst
+
+def _zbar():
+    #importing pyzbar finds libzbar, decoding a blank image proves it loads
+    from PIL import Image
+    from pyzbar import pyzbar
+    pyzbar.decode(Image.new("L", (32, 32), 255))
+
+def _ultralytics():
+    import ultralytics
+    return ultralytics.__version__
+
+def _model_fn(model_path, backend, int8, batch):
+    def model():
+        from detectorBackends import artifact_path, warm_detector
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"model file missing: {model_path}")
+        if not os.path.exists(artifact_path(model_path, backend, int8)):
+            backend_used = "torch"
+        else:
+            backend_used = backend + ("-int8" if int8 else "")
+        #the warm detector is shared, the reader picks this one up when it starts
+        det = warm_detector(model_path, backend, int8, batch=batch)
+        det.wait()
+        return f"{backend_used}, load {det.load_s * 1000:.0f} ms, warmup {det.warm_s * 1000:.0f} ms"
+    return model
+
+def build_bootstrap(cameras="csi:0", model_path=None, backend="torch", int8=False, batch=4, with_model=True,
+                    on_done=None, done_mark=None):
+    boot = Bootstrap(on_done, done_mark)
+    boot.add("numpy", _numpy)
+    boot.add("pil", _pil)
+    boot.add("gst", _gst_fn(cameras))
+    boot.add("zbar", _zbar, after=("pil",))
+    boot.add("ultralytics", _ultralytics, after=("numpy",))
+    if with_model:
+        from detectorBackends import MODEL_PATH
+        boot.add("model", _model_fn(model_path or MODEL_PATH, backend, int8, batch), after=("ultralytics",))
+    return boot
+
+_current = None
+
+def start_bootstrap(**kw):
+    #kicks off the app wide bootstrap, the reader finds it with current()
+    global _current
+    _current = build_bootstrap(**kw).start()
+    return _current
+
+def current():
+    return _current
+
+if __name__ == "__main__":
+    cams = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("CAMERAS", "csi:0")
+    boot = start_bootstrap(cameras=cams)
+    boot.wait()
+    print(boot.report())
+    sys.exit(0 if boot.ok() else 1)
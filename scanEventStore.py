@@ -0,0 +1,243 @@
+'''
+scan event store
+every decode (time, camera, box, what it matched) goes into sqlite in wal
+mode. writes are queued and committed in batches by one writer thread so
+the reader and ui threads never wait on the disk. orders stay "open" until
+they finish, so after a crash the found set of the order that was running
+can be read back and the order picks up where it left off
+
+    python scanEventStore.py [db] orders [trailer]
+    python scanEventStore.py [db] events ORDER_ID
+'''
+
+import os, sys, time, queue, sqlite3, threading, hashlib
+from contextlib import closing
+
+DB_PATH = os.environ.get("SCAN_DB", os.path.expanduser("~/.local/share/jetsonBarcodeReader/scans.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    manifest TEXT, manifest_sig TEXT, manifest_len INTEGER, trailer TEXT, dock_door TEXT,
+    started REAL, ended REAL,
+    total INTEGER DEFAULT 0, scanned INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'open'
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER, ts REAL, camera INTEGER,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    value TEXT, code TEXT, new INTEGER, frame INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_order ON events(order_id, ts);
+CREATE INDEX IF NOT EXISTS events_code ON events(code);
+CREATE INDEX IF NOT EXISTS orders_trailer ON orders(trailer, started);
+CREATE INDEX IF NOT EXISTS orders_status ON orders(status);
+"""
+
+_INSERT = "INSERT INTO events (order_id, ts, camera, x1, y1, x2, y2, value, code, new, frame) VALUES (?,?,?,?,?,?,?,?,?,?,?)"
+
+def manifest_head(path, n=4096):
+    #(sha1, length) of the first n bytes, appends leave it alone but the
+    #next days manifest written over the same file doesnt
+    try:
+        with open(path, "rb") as f:
+            data = f.read(n)
+    except OSError:
+        return None, 0
+    return hashlib.sha1(data).hexdigest(), len(data)
+
+_FLUSH = object()
+_STOP = object()
+
+class _Call:
+    #fn(conn) to run on the writer thread, result or exception lands in box
+    def __init__(self, fn):
+        self.fn = fn
+        self.box = []
+        self.done = threading.Event()
+
+class EventStore:
+    #batch: events per commit at most, flush_every: secs an event may wait
+    def __init__(self, path=DB_PATH, batch=256, flush_every=0.5):
+        self.path = path
+        self.batch = batch
+        self.flush_every = flush_every
+        self.written = 0
+        self.commits = 0
+        self._q = queue.Queue()
+        self._ready = threading.Event()
+        self._error = None
+
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="event-store")
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ===================== writer thread =====================
+    def _run(self):
+        try:
+            conn = self._connect()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  #wal + normal survives a crash, may lose the last commit on power loss
+            conn.executescript(SCHEMA)
+            conn.commit()
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        rows = []
+        deadline = 0.0
+        with closing(conn):
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if rows else None
+                try:
+                    item = self._q.get(timeout=timeout)
+                except queue.Empty:
+                    item = _FLUSH
+
+                if isinstance(item, tuple):
+                    if not rows:
+                        deadline = time.monotonic() + self.flush_every
+                    rows.append(item)
+                    if len(rows) < self.batch:
+                        continue
+                    item = _FLUSH
+
+                #everything else runs after the queued events so order is kept
+                self._write(conn, rows)
+                rows = []
+                if item is _STOP:
+                    break
+                if isinstance(item, _Call):
+                    try:
+                        item.box.append(item.fn(conn))
+                        conn.commit()
+                    except Exception as e:
+                        item.box.append(e)
+                    item.done.set()
+
+    def _write(self, conn, rows):
+        if not rows:
+            return
+        try:
+            conn.executemany(_INSERT, rows)
+            conn.commit()
+        except sqlite3.Error as e:
+            #losing one batch beats killing the writer for the rest of the shift
+            print(f"event store write fail: {e}")
+            conn.rollback()
+            return
+        self.written += len(rows)
+        self.commits += 1
+
+    def _call(self, fn):
+        #run fn(conn) on the writer thread and wait for its result
+        call = _Call(fn)
+        self._q.put(call)
+        call.done.wait()
+        if isinstance(call.box[0], Exception):
+            raise call.box[0]
+        return call.box[0]
+
+    # ===================== writes =====================
+    def open_order(self, manifest, trailer="", dock_door="", started=None):
+        started = started or time.time()
+        sig, size = manifest_head(manifest)
+        return self._call(lambda c: c.execute(
+            "INSERT INTO orders (manifest, manifest_sig, manifest_len, trailer, dock_door, started) VALUES (?,?,?,?,?,?)",
+            (manifest, sig, size, trailer, dock_door, started)).lastrowid)
+
+    def close_order(self, order_id, scanned, total, status="done", ended=None):
+        ended = ended or time.time()
+        self._call(lambda c: c.execute(
+            "UPDATE orders SET ended=?, scanned=?, total=?, status=? WHERE id=?",
+            (ended, scanned, total, status, order_id)))
+
+    def update_order(self, order_id, trailer="", dock_door=""):
+        #trailer/door can turn up later from the manifest itself
+        self._call(lambda c: c.execute(
+            "UPDATE orders SET trailer=COALESCE(NULLIF(?, ''), trailer), dock_door=COALESCE(NULLIF(?, ''), dock_door) WHERE id=?",
+            (trailer, dock_door, order_id)))
+
+    def record(self, order_id, value, code=None, new=False, camera=None, box=None, ts=None, frame=None):
+        #one decode, never blocks
+        x1, y1, x2, y2 = (int(v) for v in box) if box is not None else (None,) * 4
+        self._q.put((order_id, ts or time.time(), camera, x1, y1, x2, y2, value, code, int(bool(new)), frame))
+
+    def flush(self):
+        #returns once everything queued so far is committed
+        self._call(lambda c: None)
+
+    def close(self):
+        self._q.put(_STOP)
+        self._thread.join(5.0)
+
+    # ===================== queries =====================
+    def _query(self, sql, args=()):
+        #reads get their own connection, wal lets them run next to the writer
+        with closing(self._connect()) as conn:
+            return [dict(r) for r in conn.execute(sql, args)]
+
+    def find_open(self, manifest, trailer=""):
+        #newest unfinished order for this manifest + trailer, for crash recovery
+        #the file has to still start the same, a new manifest in the old path
+        #is a new order
+        rows = self._query(
+            "SELECT * FROM orders WHERE status='open' AND manifest=? AND trailer=? ORDER BY started DESC",
+            (manifest, trailer))
+        for r in rows:
+            if manifest_head(manifest, r["manifest_len"] or 0)[0] == r["manifest_sig"]:
+                return r
+        return None
+
+    def found_codes(self, order_id):
+        rows = self._query("SELECT DISTINCT code FROM events WHERE order_id=? AND code IS NOT NULL", (order_id,))
+        return [r["code"] for r in rows]
+
+    def orders(self, trailer=None, dock_door=None, since=None, status=None, limit=100):
+        where, args = [], []
+        for col, val in (("trailer", trailer), ("dock_door", dock_door), ("status", status)):
+            if val is not None:
+                where.append(f"{col}=?")
+                args.append(val)
+        if since is not None:
+            where.append("started>=?")
+            args.append(since)
+        sql = "SELECT * FROM orders"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._query(sql + " ORDER BY started DESC LIMIT ?", args + [limit])
+
+    def events(self, order_id, limit=None):
+        sql = "SELECT * FROM events WHERE order_id=? ORDER BY ts"
+        if limit:
+            return self._query(sql + " LIMIT ?", (order_id, limit))
+        return self._query(sql, (order_id,))
+
+    def snapshot(self):
+        return {"queued": self._q.qsize(), "written": self.written, "commits": self.commits}
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    db = args.pop(0) if args and args[0].endswith(".db") else DB_PATH
+    cmd = args.pop(0) if args else "orders"
+    store = EventStore(db)
+    if cmd == "events":
+        for e in store.events(int(args[0])):
+            print(f"{time.strftime('%H:%M:%S', time.localtime(e['ts']))} cam{e['camera']} {e['value']} -> {e['code'] or 'off manifest'}{' new' if e['new'] else ''}")
+    else:
+        for o in store.orders(trailer=args[0] if args else None):
+            print(f"{o['id']:>5} {o['trailer'] or '-':<12} {o['dock_door'] or '-':<8} {o['status']:<6} {o['scanned']}/{o['total']}  {o['manifest']}")
+    store.close()
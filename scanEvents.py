@@ -0,0 +1,51 @@
+'''
+reader -> ui event batching
+kept apart from scanPipeline (numpy, cv2) so the window can import it
+before the heavy imports are done, see scanBootstrap
+'''
+
+import threading
+
+class EventCoalescer:
+    #reader events from any thread, drained a few times a second into one
+    #batch so a busy scene cant flood the qt event loop. a value only gets
+    #delivered once per key until reset(), repeated log lines collapse into a count
+    def __init__(self, max_lines=200):
+        self.max_lines = max_lines
+        self.dropped = 0
+        self._values = []
+        self._seen = set()
+        self._lines = {}  #msg -> times seen since the last drain, in order
+        self._lock = threading.Lock()
+
+    def value(self, v, key=None):
+        #True the first time key (v by default) shows up
+        key = v if key is None else key
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            self._values.append(v)
+            return True
+
+    def log(self, msg):
+        with self._lock:
+            if msg in self._lines:
+                self._lines[msg] += 1
+            elif len(self._lines) < self.max_lines:
+                self._lines[msg] = 1
+            else:
+                self.dropped += 1
+
+    def drain(self):
+        #(new values, log lines) since the last drain
+        with self._lock:
+            values, self._values = self._values, []
+            lines, self._lines = self._lines, {}
+        return values, [m if n == 1 else f"{m} (x{n})" for m, n in lines.items()]
+
+    def reset(self):
+        #next order, every value counts as new again
+        with self._lock:
+            self._seen = set()
+            self._values = []
@@ -0,0 +1,260 @@
+'''
+counters and latency histograms for the barcode reader
+the reader times pull-sample wait, buffer map/convert, yolo predict, each
+crop decode and the ui signal emits, and counts frames, detections,
+decodes, misses and off manifest reads. NullMetrics is the default and
+does nothing, so none of this costs anything unless it is turned on
+
+    METRICS=1         keep metrics for the on screen overlay (F3)
+    METRICS_PORT=9108 same plus prometheus text on http://127.0.0.1:9108/metrics
+'''
+
+import time, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "barcode_reader"
+
+#histogram upper bounds in secs
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+#name -> (kind, help), anything not listed still works, just without help text
+METRICS = {
+    "pull_wait_seconds": ("histogram", "time blocked in try-pull-sample / reading the next frame"),
+    "convert_seconds": ("histogram", "buffer map + copy into a pooled frame"),
+    "yolo_predict_seconds": ("histogram", "one yolo predict call (a whole batch)"),
+    "crop_decode_seconds": ("histogram", "decoder chain on one crop (thread or inline pools, process workers dont report)"),
+    "signal_emit_seconds": ("histogram", "one batch of ui signal emits"),
+    "frames_total": ("counter", "frames captured"),
+    "detections_total": ("counter", "boxes from yolo"),
+    "decodes_total": ("counter", "values read from crops"),
+    "misses_total": ("counter", "crops decoded with nothing read"),
+    "cache_hits_total": ("counter", "crops skipped by the decode cache"),
+    "off_manifest_total": ("counter", "reads not on the manifest"),
+    "queue_depth": ("gauge", "items waiting per pipeline queue"),
+    "codes_found": ("gauge", "manifest codes found this order"),
+}
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  #last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, secs):
+        i = 0
+        for b in self.buckets:
+            if secs <= b:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.sum += secs
+        self.count += 1
+
+    def quantile(self, q):
+        #upper bound of the bucket the q-th observation falls in, good enough for a glance
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.t0)
+        return False
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, prefix=PREFIX, buckets=BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.started = time.monotonic()
+        self.counters = {}
+        self.gauges = {}    #name -> {label value: number}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value, label=""):
+        with self._lock:
+            self.gauges.setdefault(name, {})[label] = value
+
+    def observe(self, name, secs):
+        with self._lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = Histogram(self.buckets)
+            h.observe(secs)
+
+    def time(self, name):
+        #with metrics.time("yolo_predict_seconds"): ...
+        return _Timer(self, name)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.monotonic()
+
+    # ===================== output =====================
+    def render(self):
+        #prometheus text exposition format
+        lines = []
+        with self._lock:
+            for name, v in sorted(self.counters.items()):
+                self._head(lines, name, "counter")
+                lines.append(f"{self.prefix}_{name} {v}")
+            for name, vals in sorted(self.gauges.items()):
+                self._head(lines, name, "gauge")
+                for label, v in sorted(vals.items()):
+                    tag = f'{{name="{label}"}}' if label else ""
+                    lines.append(f"{self.prefix}_{name}{tag} {v}")
+            for name, h in sorted(self.histograms.items()):
+                self._head(lines, name, "histogram")
+                full = f"{self.prefix}_{name}"
+                seen = 0
+                for b, c in zip(h.buckets, h.counts):
+                    seen += c
+                    lines.append(f'{full}_bucket{{le="{b}"}} {seen}')
+                lines.append(f'{full}_bucket{{le="+Inf"}} {h.count}')
+                lines.append(f"{full}_sum {h.sum:.6f}")
+                lines.append(f"{full}_count {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def _head(self, lines, name, kind):
+        kind_, text = METRICS.get(name, (kind, ""))
+        if text:
+            lines.append(f"# HELP {self.prefix}_{name} {text}")
+        lines.append(f"# TYPE {self.prefix}_{name} {kind_}")
+
+    def snapshot(self):
+        #plain dict for json (bench results) and the overlay
+        with self._lock:
+            out = {
+                "uptime_s": round(time.monotonic() - self.started, 1),
+                "counters": dict(self.counters),
+                "gauges": {k: dict(v) for k, v in self.gauges.items()},
+                "timers": {},
+            }
+            for name, h in self.histograms.items():
+                out["timers"][name] = {
+                    "count": h.count,
+                    "mean_ms": round(h.sum / h.count * 1000, 2) if h.count else None,
+                    "p50_ms": _ms(h.quantile(0.5)),
+                    "p95_ms": _ms(h.quantile(0.95)),
+                }
+        return out
+
+    def summary_lines(self):
+        #short text for the debug overlay
+        snap = self.snapshot()
+        up = max(snap["uptime_s"], 0.1)
+        c = snap["counters"]
+        lines = [f"frames {c.get('frames_total', 0)} ({c.get('frames_total', 0) / up:.1f}/s)  "
+                 f"boxes {c.get('detections_total', 0)}  reads {c.get('decodes_total', 0)}  "
+                 f"misses {c.get('misses_total', 0)}  off {c.get('off_manifest_total', 0)}"]
+        for name, t in sorted(snap["timers"].items()):
+            short = name[:-len("_seconds")] if name.endswith("_seconds") else name
+            lines.append(f"{short:<14} n={t['count']:<7} mean {t['mean_ms']}ms  p50<={t['p50_ms']}ms  p95<={t['p95_ms']}ms")
+        depths = snap["gauges"].get("queue_depth", {})
+        if depths:
+            lines.append("queues " + "  ".join(f"{k} {v}" for k, v in sorted(depths.items())))
+        return lines
+
+def _ms(secs):
+    if secs is None:
+        return None
+    return "inf" if secs == float("inf") else round(secs * 1000, 2)
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class NullMetrics:
+    #same calls as Metrics, all of them do nothing
+    enabled = False
+
+    def inc(self, name, n=1):
+        pass
+
+    def gauge(self, name, value, label=""):
+        pass
+
+    def observe(self, name, secs):
+        pass
+
+    def time(self, name):
+        return _NULL_TIMER
+
+    def reset(self):
+        pass
+
+    def render(self):
+        return ""
+
+    def snapshot(self):
+        return {}
+
+    def summary_lines(self):
+        return ["metrics off, start with METRICS=1 or METRICS_PORT"]
+
+# ===================== http endpoint =====================
+class MetricsServer(threading.Thread):
+    #GET /metrics (or /) returns the prometheus text, local only by default
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        super().__init__(daemon=True, name="metrics-http")
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  #scrapes every few secs would flood stdout
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+
+    def run(self):
+        self.httpd.serve_forever(poll_interval=0.5)
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def serve_metrics(metrics, port, host="127.0.0.1"):
+    server = MetricsServer(metrics, port, host)
+    server.start()
+    return server
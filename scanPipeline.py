@@ -0,0 +1,354 @@
+'''
+pipeline pieces for the barcode reader
+bounded drop-oldest queues and stage threads so capture, yolo and zbar
+can all run at their own speed instead of waiting on each other
+'''
+
+import math, threading, time
+from collections import deque
+
+import numpy as np
+
+try:
+    import cv2  #jetpack ships opencv, used for the area resize if its there
+except Exception:
+    cv2 = None
+
+# ===================== bounded queue =====================
+class DropQueue:
+    #bounded queue, when its full the oldest item gets thrown away
+    #so a slow consumer always works on the newest stuff
+    #block=True waits for room instead (replay/bench, every frame counts)
+    def __init__(self, maxsize, name="queue", on_drop=None, block=False):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.on_drop = on_drop  #gets the thrown away item, used to hand buffers back
+        self.block = block
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        old = None
+        with self._cond:
+            while self.block and len(self._items) >= self.maxsize and not self._closed:
+                self._cond.wait(0.1)
+            if len(self._items) >= self.maxsize:
+                old = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+        if old is not None and self.on_drop:
+            self.on_drop(old)
+
+    def get(self, timeout=None):
+        #returns None on timeout or once closed and empty
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            if self.block:
+                self._cond.notify_all()
+            return item
+
+    def take(self, n):
+        #up to n more items without waiting, oldest first
+        with self._cond:
+            out = []
+            while self._items and len(out) < n:
+                out.append(self._items.popleft())
+            if out and self.block:
+                self._cond.notify_all()
+            return out
+
+    def take_until(self, n, deadline):
+        #up to n items, waiting for more until deadline (time.monotonic)
+        out = []
+        with self._cond:
+            while len(out) < n:
+                while self._items and len(out) < n:
+                    out.append(self._items.popleft())
+                if out and self.block:
+                    self._cond.notify_all()
+                left = deadline - time.monotonic()
+                if len(out) >= n or self._closed or left <= 0:
+                    break
+                self._cond.wait(left)
+        return out
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+    def snapshot(self):
+        return {"depth": len(self._items), "max": self.maxsize, "dropped": self.dropped}
+
+# ===================== frame buffers =====================
+class FramePool:
+    #keeps finished frame buffers around so capture does one copy into an
+    #existing array per frame instead of allocating a fresh one every time
+    def __init__(self, keep=8):
+        self.keep = keep
+        self.allocated = 0
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, shape):
+        shape = tuple(shape)
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                return free.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, arr):
+        with self._lock:
+            free = self._free.setdefault(arr.shape, [])
+            if len(free) < self.keep:
+                free.append(arr)
+
+    def snapshot(self):
+        with self._lock:
+            return {"allocated": self.allocated, "free": sum(len(v) for v in self._free.values())}
+
+class Frame:
+    #one captured frame sitting in a pool buffer
+    #pixels is what zbar reads (bgr or luma), det is an optional smaller bgr
+    #image just for yolo, scale maps det coords back onto pixels
+    #whoever handles it last calls release() so the buffers get reused
+    def __init__(self, pixels, pool=None, index=0, det=None, scale=(1.0, 1.0), camera=0):
+        self.pixels = pixels
+        self.det = det
+        self.scale = scale
+        self.index = index
+        self.camera = camera
+        self.ts = time.monotonic()
+        self._pool = pool
+
+    def detect_image(self):
+        return self.det if self.det is not None else self.pixels
+
+    def release(self):
+        pixels, self.pixels = self.pixels, None
+        det, self.det = self.det, None
+        if self._pool is not None:
+            if pixels is not None:
+                self._pool.release(pixels)
+            if det is not None:
+                self._pool.release(det)
+
+#bgr weights out of 256, same split pil uses for L (299/587/114)
+_LUMA = np.array([29, 150, 77], dtype=np.uint16)
+
+def clip_box(box, w, h):
+    x1, y1, x2, y2 = (int(v) for v in box)
+    return max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+
+def scale_boxes(xyxy, sx, sy):
+    #detection boxes from a downscaled image back to full res pixel coords
+    out = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+    if sx != 1.0 or sy != 1.0:
+        out = out * np.array([sx, sy, sx, sy], dtype=np.float32)
+    return out.astype(int)
+
+def pad_boxes(boxes, frac, px, w, h):
+    #grow each box by frac of its size (at least px) and clip to the frame
+    #gives zbar the quiet zone yolo tends to cut off on small labels
+    if len(boxes) == 0:
+        return boxes
+    b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    pad_x = np.maximum((b[:, 2] - b[:, 0]) * frac, px)
+    pad_y = np.maximum((b[:, 3] - b[:, 1]) * frac, px)
+    out = np.stack([b[:, 0] - pad_x, b[:, 1] - pad_y, b[:, 2] + pad_x, b[:, 3] + pad_y], axis=1)
+    out[:, [0, 2]] = np.clip(out[:, [0, 2]], 0, w)
+    out[:, [1, 3]] = np.clip(out[:, [1, 3]], 0, h)
+    return out.astype(int)
+
+def downscale(pixels, width, pool=None):
+    #area-averaged smaller copy of a bgr frame for yolo
+    #plain striding would alias the bars, so average whole pixel blocks
+    h, w = pixels.shape[:2]
+    if cv2 is not None:
+        dh = max(1, int(round(h * width / w)))
+        out = pool.acquire((dh, width, 3)) if pool else None
+        return cv2.resize(pixels, (width, dh), dst=out, interpolation=cv2.INTER_AREA)
+
+    f = max(1, w // width)
+    dh, dw = h // f, w // f
+    block = pixels[:dh * f, :dw * f].reshape(dh, f, dw, f, 3)
+    summed = block.sum(axis=(1, 3), dtype=np.uint16)
+    out = pool.acquire((dh, dw, 3)) if pool else np.empty((dh, dw, 3), dtype=np.uint8)
+    np.floor_divide(summed, f * f, out=out, casting="unsafe")
+    return out
+
+def gray_crop(pixels, box):
+    #grayscale of just the box, the frame itself is only sliced not copied
+    h, w = pixels.shape[:2]
+    x1, y1, x2, y2 = clip_box(box, w, h)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    crop = pixels[y1:y2, x1:x2]
+    if crop.ndim == 2:
+        return crop
+    return ((crop @ _LUMA) >> 8).astype(np.uint8)
+
+# ===================== stage timing =====================
+def percentile(sorted_vals, p):
+    #nearest rank on an already sorted list
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, max(0, math.ceil(p / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[i]
+
+class StageStats:
+    #running latency numbers for one stage, all in seconds internally
+    #percentiles come from the last `window` samples
+    def __init__(self, name, window=2048):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, secs):
+        with self._lock:
+            self.count += 1
+            self.total += secs
+            self.last = secs
+            self._recent.append(secs)
+            if secs > self.max:
+                self.max = secs
+
+    def snapshot(self):
+        with self._lock:
+            avg = self.total / self.count if self.count else 0.0
+            recent = sorted(self._recent)
+            return {
+                "count": self.count,
+                "last_ms": round(self.last * 1000, 2),
+                "avg_ms": round(avg * 1000, 2),
+                "p50_ms": round(percentile(recent, 50) * 1000, 2),
+                "p95_ms": round(percentile(recent, 95) * 1000, 2),
+                "p99_ms": round(percentile(recent, 99) * 1000, 2),
+                "max_ms": round(self.max * 1000, 2),
+            }
+
+# ===================== stage threads =====================
+class Stage:
+    #runs fn on every item from inbox using one or more threads
+    #with no inbox fn gets called with no args over and over (capture style)
+    def __init__(self, name, fn, inbox=None, workers=1, on_error=None):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.workers = max(1, int(workers))
+        self.on_error = on_error
+        self.errors = 0
+        self.stats = StageStats(name)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self.inbox is not None:
+                item = self.inbox.get(timeout=0.1)
+                if item is None:
+                    continue
+
+            t0 = time.perf_counter()
+            try:
+                if self.inbox is not None:
+                    self.fn(item)
+                else:
+                    self.fn()
+            except Exception as e:
+                self.errors += 1
+                if self.on_error:
+                    self.on_error(self.name, e)
+            self.stats.add(time.perf_counter() - t0)
+
+    def stop(self):
+        self._stop.set()
+        if self.inbox is not None:
+            self.inbox.close()
+
+    def join(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+def pipeline_stats(stages, queues):
+    #one dict with latency per stage and depth per queue
+    out = {}
+    for st in stages:
+        snap = st.stats.snapshot()
+        snap["errors"] = st.errors
+        out[st.name] = snap
+    for q in queues:
+        out[f"{q.name}_queue"] = q.snapshot()
+    return out
+
+# ===================== frame pacing =====================
+class FramePacer:
+    #decides how long capture waits before grabbing the next frame
+    #budget is counted from begin() so time already spent is not slept again
+    #several capture threads can share one pacer by passing begin()'s t0 to wait()
+    def __init__(self, frame_budget=0.0, idle_budget=0.2, idle_after=10, hot_frames=5):
+        self.frame_budget = frame_budget  #seconds per frame normally, 0 = camera speed
+        self.idle_budget = idle_budget    #seconds per frame once nothing is in view
+        self.idle_after = idle_after      #frames with no detections before backing off
+        self.hot_frames = hot_frames      #frames at full speed after a new code shows up
+        self._t0 = time.perf_counter()
+        self._empty = 0
+        self._hot = 0
+
+    def begin(self):
+        self._t0 = time.perf_counter()
+        return self._t0
+
+    def note_frame(self, detections):
+        #detect stage reports how many boxes yolo found
+        if detections:
+            self._empty = 0
+        else:
+            self._empty += 1
+        if self._hot:
+            self._hot -= 1
+
+    def note_new(self):
+        #decode stage saw a code it had not seen before
+        self._empty = 0
+        self._hot = self.hot_frames
+
+    def idle(self):
+        return self._empty >= self.idle_after
+
+    def target(self):
+        if self._hot:
+            return 0.0
+        if self.idle():
+            return max(self.frame_budget, self.idle_budget)
+        return self.frame_budget
+
+    def wait(self, t0=None):
+        t0 = self._t0 if t0 is None else t0
+        left = self.target() - (time.perf_counter() - t0)
+        if left > 0:
+            time.sleep(left)
+        return left
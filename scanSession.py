@@ -0,0 +1,74 @@
+'''
+orders for the session engine
+an order is one trailer at one dock door plus its manifest. the queue hands
+them to the app one after another while the camera, model and decoder pool
+stay up the whole shift. orders files are csv or jsonl with manifest,
+trailer and dock_door columns (door / trailer_id spellings work too)
+'''
+
+import os, csv, json, threading
+from collections import deque
+
+from manifestIndex import FIELD_ALIASES
+
+class Order:
+    def __init__(self, manifest, trailer="", dock_door="", fmt=None):
+        self.manifest = manifest    #manifest file path
+        self.trailer = trailer
+        self.dock_door = dock_door
+        self.fmt = fmt              #manifest format, None = from the extension
+        self.index = None           #ManifestIndex once the order is running
+        self.order_id = None        #row in the event store, if there is one
+        self.start_time = None
+        self.end_time = None
+        self.scanned = 0
+
+    def resolve(self):
+        #trailer/door the order didnt name come from the manifest itself
+        #(json header fields, or the first carton row of a csv/jsonl)
+        if self.index is None:
+            return
+        info = self.index.info
+        first = self.index.meta.get(0, {})
+        if not self.trailer:
+            self.trailer = str(info.get("trailer") or first.get("trailer") or "")
+        if not self.dock_door:
+            self.dock_door = str(info.get("dock_door") or first.get("dock_door") or "")
+
+class OrderQueue:
+    #orders waiting to be scanned, oldest first
+    def __init__(self, orders=()):
+        self._orders = deque(orders)
+        self._lock = threading.Lock()
+
+    def next(self):
+        #oldest waiting order or None
+        with self._lock:
+            return self._orders.popleft() if self._orders else None
+
+    def __len__(self):
+        return len(self._orders)
+
+def _order_from_row(row, base):
+    row = {FIELD_ALIASES.get(k.strip().lower(), k.strip().lower()): v for k, v in row.items() if k}
+    path = str(row.get("manifest") or row.get("path") or "").strip()
+    if not path:
+        return None
+    if not os.path.isabs(path):
+        path = os.path.join(base, path)
+    return Order(path, str(row.get("trailer") or "").strip(), str(row.get("dock_door") or "").strip())
+
+def load_orders(path):
+    #orders in file order, rows with no manifest get skipped
+    base = os.path.dirname(os.path.abspath(path))
+    out = []
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for row in rows:
+        order = _order_from_row(row, base) if isinstance(row, dict) else None
+        if order is not None:
+            out.append(order)
+    return out
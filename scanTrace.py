@@ -0,0 +1,178 @@
+'''
+per frame trace spans for offline profiling
+capture, detect, yolo, each crop decode and the ui updates go into a
+bounded ring buffer as chrome trace events. the buffer gets written out
+on demand (F4 on the scan screen, bench --trace) or by itself when a frame
+takes longer than slow_ms from capture to decoded, so the seconds before
+a stall are on disk. open the json in ui.perfetto.dev or chrome://tracing
+
+    TRACE=1 TRACE_SLOW_MS=1500 python jetsonBarcodeReaderv003.py
+'''
+
+import os, json, time, threading
+from collections import deque
+
+TRACE_DIR = os.environ.get("TRACE_DIR", os.path.expanduser("~/.local/share/jetsonBarcodeReader/traces"))
+
+class _Span:
+    def __init__(self, trace, name, cat, args):
+        self.trace = trace
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.t0 = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, self.t0, time.monotonic(), self.cat, **self.args)
+        return False
+
+class TraceRecorder:
+    #size: events kept, the oldest fall off. slow_ms: frames slower than
+    #this dump the buffer (0 = never), at most one dump per min_gap secs
+    #and max_dumps per run so a bad shift cant fill the disk
+    enabled = True
+
+    def __init__(self, size=50000, slow_ms=1000, out_dir=TRACE_DIR, min_gap=30.0, max_dumps=20):
+        self.slow_ms = slow_ms
+        self.out_dir = out_dir
+        self.min_gap = min_gap
+        self.max_dumps = max_dumps
+        self.dumps = []
+        self.slow_frames = 0
+        self.pid = os.getpid()
+        self._t0 = time.monotonic()
+        #(ph, name, cat, ts_us, dur_us, tid, id, args), made into dicts only on dump
+        self._buf = deque(maxlen=size)
+        self._threads = {}
+        self._last_dump = 0.0
+        self._lock = threading.Lock()
+
+    def _us(self, t):
+        return int((t - self._t0) * 1e6)
+
+    def _tid(self):
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        return tid
+
+    # ===================== recording =====================
+    def add(self, name, t0, t1, cat="reader", **args):
+        #one finished span, t0/t1 are time.monotonic() values
+        self._buf.append(("X", name, cat, self._us(t0), self._us(t1) - self._us(t0), self._tid(), None, args))
+
+    def span(self, name, cat="reader", **args):
+        #with trace.span("detect", frames=3): ...
+        return _Span(self, name, cat, args)
+
+    def instant(self, name, cat="reader", **args):
+        self._buf.append(("i", name, cat, self._us(time.monotonic()), 0, self._tid(), None, args))
+
+    def frame_done(self, frame, stage="decode"):
+        #async span from when the frame was captured to now, one track per frame,
+        #and the dump when it was a slow one
+        t1 = time.monotonic()
+        fid = (frame.camera << 32) | frame.index
+        name = f"cam{frame.camera} frame {frame.index}"
+        tid = self._tid()
+        self._buf.append(("b", name, "frame", self._us(frame.ts), 0, tid, fid, {"camera": frame.camera, "index": frame.index}))
+        self._buf.append(("e", name, "frame", self._us(t1), 0, tid, fid, {"last": stage}))
+
+        ms = (t1 - frame.ts) * 1000
+        if self.slow_ms and ms > self.slow_ms:
+            self.slow_frames += 1
+            self.instant("slow frame", camera=frame.camera, index=frame.index, ms=round(ms, 1))
+            self._auto_dump(f"slow-cam{frame.camera}-{frame.index}")
+
+    # ===================== output =====================
+    def events(self):
+        with self._lock:
+            buf = list(self._buf)
+            threads = dict(self._threads)
+        out = [{"ph": "M", "name": "process_name", "pid": self.pid, "args": {"name": "barcodeReader"}}]
+        for tid, tname in threads.items():
+            out.append({"ph": "M", "name": "thread_name", "pid": self.pid, "tid": tid, "args": {"name": tname}})
+        for ph, name, cat, ts, dur, tid, fid, args in buf:
+            e = {"ph": ph, "name": name, "cat": cat, "ts": ts, "pid": self.pid, "tid": tid}
+            if ph == "X":
+                e["dur"] = dur
+            elif ph == "i":
+                e["s"] = "t"
+            else:
+                e["id"] = fid
+            if args:
+                e["args"] = args
+            out.append(e)
+        return out
+
+    def dump(self, path=None, reason="manual"):
+        #writes the buffer as chrome trace json, returns the path
+        if path is None:
+            os.makedirs(self.out_dir, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.out_dir, f"trace-{stamp}-{reason}.json")
+        data = {
+            "traceEvents": self.events(),
+            "displayTimeUnit": "ms",
+            "otherData": {"reason": reason, "slow_ms": self.slow_ms, "slow_frames": self.slow_frames},
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+        self.dumps.append(path)
+        return path
+
+    def _auto_dump(self, reason):
+        now = time.monotonic()
+        with self._lock:
+            if len(self.dumps) >= self.max_dumps or now - self._last_dump < self.min_gap:
+                return
+            self._last_dump = now
+        #let the stall finish landing in the buffer, then write off the hot path
+        t = threading.Timer(0.5, self._dump_quietly, args=(reason,))
+        t.daemon = True
+        t.start()
+
+    def _dump_quietly(self, reason):
+        try:
+            print(f"trace dumped: {self.dump(reason=reason)}")
+        except Exception as e:
+            print(f"trace dump fail: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._buf.clear()
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class NullTrace:
+    #same calls as TraceRecorder, all of them do nothing
+    enabled = False
+    dumps = []
+
+    def add(self, name, t0, t1, cat="reader", **args):
+        pass
+
+    def span(self, name, cat="reader", **args):
+        return _NULL_SPAN
+
+    def instant(self, name, cat="reader", **args):
+        pass
+
+    def frame_done(self, frame, stage="decode"):
+        pass
+
+    def dump(self, path=None, reason="manual"):
+        return None
+
+    def clear(self):
+        pass
@@ -0,0 +1,225 @@
+'''
+cheap box tracking between yolo frames
+yolo only runs every few frames (or when the picture moves) and the boxes
+get carried forward with a constant velocity guess in between
+plus a cache of regions that already decoded so they skip zbar
+'''
+
+import itertools, threading, time
+
+import numpy as np
+
+def box_iou(a, b):
+    #iou between two xyxy boxes
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    iw, ih = max(0.0, ix2 - ix1), max(0.0, iy2 - iy1)
+    inter = iw * ih
+    if inter <= 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+# ===================== tracks =====================
+class Track:
+    def __init__(self, tid, box):
+        self.id = tid
+        self.det_box = np.asarray(box, dtype=np.float32)  #box at the last yolo hit
+        self.box = self.det_box.copy()                    #current guess
+        self.vel = np.zeros(4, dtype=np.float32)          #per frame change
+        self.since_det = 0
+        self.misses = 0
+
+class BoxTracker:
+    #greedy iou matching on yolo frames, constant velocity in between
+    def __init__(self, iou_thresh=0.3, max_misses=2, smoothing=0.5):
+        self.iou_thresh = iou_thresh
+        self.max_misses = max_misses  #yolo frames a track may go unmatched
+        self.smoothing = smoothing    #how much a new velocity reading counts
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes):
+        #yolo frame, returns [(track_id, box), ...] in the same order as boxes
+        boxes = [np.asarray(b, dtype=np.float32) for b in boxes]
+        pairs = []
+        for ti, t in enumerate(self.tracks):
+            for bi, b in enumerate(boxes):
+                iou = box_iou(t.box, b)
+                if iou >= self.iou_thresh:
+                    pairs.append((iou, ti, bi))
+        pairs.sort(reverse=True)
+
+        used_t, used_b = set(), set()
+        ids = [None] * len(boxes)
+        for _, ti, bi in pairs:
+            if ti in used_t or bi in used_b:
+                continue
+            used_t.add(ti)
+            used_b.add(bi)
+            t = self.tracks[ti]
+            frames = max(1, t.since_det + 1)
+            seen_vel = (boxes[bi] - t.det_box) / frames
+            t.vel = self.smoothing * seen_vel + (1 - self.smoothing) * t.vel
+            t.det_box = boxes[bi]
+            t.box = boxes[bi].copy()
+            t.since_det = 0
+            t.misses = 0
+            ids[bi] = t.id
+
+        keep = []
+        for ti, t in enumerate(self.tracks):
+            if ti in used_t:
+                keep.append(t)
+                continue
+            t.misses += 1
+            if t.misses <= self.max_misses:
+                t.since_det += 1
+                t.box = t.det_box + t.vel * t.since_det
+                keep.append(t)
+
+        for bi, b in enumerate(boxes):
+            if ids[bi] is None:
+                t = Track(next(self._ids), b)
+                keep.append(t)
+                ids[bi] = t.id
+
+        self.tracks = keep
+        return list(zip(ids, boxes))
+
+    def predict(self):
+        #frame without yolo, move every track along its velocity
+        out = []
+        for t in self.tracks:
+            t.since_det += 1
+            t.box = t.det_box + t.vel * t.since_det
+            out.append((t.id, t.box))
+        return out
+
+    def reset(self):
+        self.tracks = []
+
+# ===================== motion trigger =====================
+class MotionGate:
+    #tiny thumbnail diff against the last yolo frame, says when the
+    #picture changed enough that tracked boxes cant be trusted anymore
+    def __init__(self, thresh=6.0, step=8):
+        self.thresh = thresh  #mean abs pixel change (0-255)
+        self.step = step
+        self._ref = None
+
+    def _thumb(self, img):
+        t = img[::self.step, ::self.step]
+        if t.ndim == 3:
+            t = t[:, :, 1]  #green is close enough to luma for this
+        return t.astype(np.int16)
+
+    def moved(self, img):
+        if self._ref is None:
+            return True
+        t = self._thumb(img)
+        if t.shape != self._ref.shape:
+            return True
+        return float(np.abs(t - self._ref).mean()) > self.thresh
+
+    def mark(self, img):
+        #call on every yolo frame so motion is measured from there
+        self._ref = self._thumb(img)
+
+    def reset(self):
+        self._ref = None
+
+# ===================== decode cache =====================
+def dhash(gray, size=8):
+    #64 bit difference hash of a grayscale crop, block averaged so the
+    #bars dont alias, close crops of the same label land a few bits apart
+    h, w = gray.shape[:2]
+    if h < size or w < size + 1:
+        return None
+    ys = np.linspace(0, h, size + 1).astype(int)[:-1]
+    xs = np.linspace(0, w, size + 2).astype(int)[:-1]
+    rows = np.add.reduceat(gray.astype(np.uint32), ys, axis=0)
+    blocks = np.add.reduceat(rows, xs, axis=1)
+    bits = (blocks[:, 1:] > blocks[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+class DecodeCache:
+    #regions that already decoded, keyed by track id and/or crop hash
+    #a decode is trusted for ttl secs after it was read, hits dont extend
+    #it, after that the crop gets decoded again. neither the track id nor
+    #the hash can tell a label apart from the next one swapped into the
+    #same spot (sequential sscc labels hash 0-1 bits apart), the re-read
+    #is what catches it
+    def __init__(self, ttl=0.5, max_dist=6):
+        self.ttl = ttl
+        self.max_dist = max_dist  #hamming bits allowed between crop hashes
+        self.hits = 0
+        self.misses = 0
+        self._tracks = {}
+        self._hashes = []
+        self._lock = threading.Lock()
+
+    def _near(self, e, where):
+        #hash matches only count at about the same spot in the same camera,
+        #a pallet of sequential labels all hash alike
+        if where is None or e[3] is None:
+            return where is None and e[3] is None
+        return e[3][0] == where[0] and box_iou(e[3][1], where[1]) >= 0.3
+
+    def _match(self, e, phash, where):
+        return bin(e[0] ^ phash).count("1") <= self.max_dist and self._near(e, where)
+
+    def lookup(self, tid=None, phash=None, where=None, by_hash=True):
+        #where = (camera, box) of the crop, phash also vets track hits,
+        #by_hash=False only matches by track id
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            entry = self._tracks.get(tid) if tid is not None else None
+            #same track but a different picture, the label under the box changed
+            if entry is not None and phash is not None and entry[0] is not None:
+                if bin(entry[0] ^ phash).count("1") > self.max_dist:
+                    entry = None
+            if entry is None and phash is not None and by_hash:
+                for e in self._hashes:
+                    if self._match(e, phash, where):
+                        entry = e
+                        break
+            if entry is None:
+                self.misses += 1
+                return None
+            if tid is not None:
+                self._tracks[tid] = entry
+            self.hits += 1
+            return entry[1]
+
+    def store(self, values, tid=None, phash=None, where=None):
+        #a re-read replaces the entry it supersedes, the hash list only
+        #holds one entry per region
+        now = time.monotonic()
+        entry = [phash, list(values), now + self.ttl, where]
+        with self._lock:
+            old = self._tracks.get(tid) if tid is not None else None
+            if old is not None or phash is not None:
+                self._hashes = [
+                    e for e in self._hashes
+                    if e is not old and (phash is None or not self._match(e, phash, where))
+                ]
+            if tid is not None:
+                self._tracks[tid] = entry
+            if phash is not None:
+                self._hashes.append(entry)
+
+    def _prune(self, now):
+        self._tracks = {k: e for k, e in self._tracks.items() if e[2] > now}
+        self._hashes = [e for e in self._hashes if e[2] > now]
+
+    def clear(self):
+        with self._lock:
+            self._tracks = {}
+            self._hashes = []
+
+    def snapshot(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._hashes) + len(self._tracks)}
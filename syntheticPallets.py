@@ -0,0 +1,237 @@
+'''
+synthetic pallet frames for testing decode speed without the dock
+renders code128 labels for manifest codes onto a cardboard background at
+a chosen module size, skew, blur, noise and occlusion. every frame gets a
+json file next to it with the ground truth (code, box, angle, occluded),
+the folder works as a dir: source for benchBarcodeReader
+
+    python syntheticPallets.py out/ --codes 60 --per-frame 6 --skew 10 --blur 0.8
+    python syntheticPallets.py out/ --manifest barcodes.txt --frames 100 --occlusion 0.2
+'''
+
+import os, sys, json, argparse
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+# ===================== code128 =====================
+#bar/space widths for symbol values 0-106 (103-105 start a/b/c, 106 stop)
+_C128 = (
+    "212222 222122 222221 121223 121322 131222 122213 122312 132212 221213 "
+    "221312 231212 112232 122132 122231 113222 123122 123221 223211 221132 "
+    "221231 213212 223112 312131 311222 321122 321221 312212 322112 322211 "
+    "212123 212321 232121 111323 131123 131321 112313 132113 132311 211313 "
+    "231113 231311 112133 112331 132131 113123 113321 133121 313121 211331 "
+    "231131 213113 213311 213131 311123 311321 331121 312113 312311 332111 "
+    "314111 221411 431111 111224 111422 121124 121421 141122 141221 112214 "
+    "112412 122114 122411 142112 142211 241211 221114 413111 241112 134111 "
+    "111242 121142 121241 114212 124112 124211 411212 421112 421211 212141 "
+    "214121 412121 111143 111341 131141 114113 114311 411113 411311 113141 "
+    "114131 311141 411131 211412 211214 211232 2331112"
+).split()
+_START_B, _START_C, _CODE_B, _CODE_C, _STOP = 104, 105, 100, 99, 106
+
+def code128_values(text):
+    #symbol values incl start, check and stop. set c for runs of 4+ digits
+    #(or an all digit even length string), set b for everything else
+    vals = []
+    i, cur = 0, None
+    while i < len(text):
+        run = 0
+        while i + run < len(text) and text[i + run].isdigit():
+            run += 1
+        use_c = run >= 4 or (run == len(text) and run % 2 == 0 and run >= 2)
+        if use_c:
+            if run % 2:
+                #odd run, the first digit goes in set b
+                if cur != "B":
+                    vals.append(_START_B if cur is None else _CODE_B)
+                    cur = "B"
+                vals.append(ord(text[i]) - 32)
+                i += 1
+                run -= 1
+            if cur != "C":
+                vals.append(_START_C if cur is None else _CODE_C)
+                cur = "C"
+            for j in range(i, i + run, 2):
+                vals.append(int(text[j:j + 2]))
+            i += run
+        else:
+            if cur != "B":
+                vals.append(_START_B if cur is None else _CODE_B)
+                cur = "B"
+            ch = ord(text[i])
+            if not 32 <= ch <= 127:
+                raise ValueError(f"cant encode {text[i]!r} in code128 set b")
+            vals.append(ch - 32)
+            i += 1
+    check = vals[0] + sum(v * k for k, v in enumerate(vals[1:], 1))
+    return vals + [check % 103, _STOP]
+
+def render_code128(text, module=2, height=60, quiet=10):
+    #black on white uint8 barcode, quiet zone of `quiet` modules each side
+    widths = [int(c) for v in code128_values(text) for c in _C128[v]]
+    total = sum(widths) + 2 * quiet
+    row = np.full(total * module, 255, dtype=np.uint8)
+    x = quiet * module
+    for k, w in enumerate(widths):
+        if k % 2 == 0:
+            row[x:x + w * module] = 0
+        x += w * module
+    return np.repeat(row[None, :], height, axis=0)
+
+def render_label(code, module=2, bar_height=None, text=True):
+    #white label with the barcode and the human readable line under it
+    bar_height = bar_height or max(30, 28 * module)
+    bars = render_code128(code, module, bar_height)
+    pad = 4 * module
+    text_h = 12 + 2 * module if text else 0
+    h, w = bars.shape[0] + 2 * pad + text_h, bars.shape[1]
+    label = Image.new("L", (w, h), 255)
+    label.paste(Image.fromarray(bars), (0, pad))
+    if text:
+        ImageDraw.Draw(label).text((w // 2 - 3 * len(code), pad + bars.shape[0] + 2), code, fill=0)
+    return label
+
+# ===================== scenes =====================
+class PalletScene:
+    #one camera's view of a pallet face, labels laid out on a jittered grid
+    #skew: max rotation in degrees, blur: gaussian radius in px, noise: sigma
+    #occlusion: chance a label gets partly covered (strap, glove...)
+    def __init__(self, width=1920, height=1080, module=2, skew=0.0, blur=0.0, noise=0.0, occlusion=0.0, seed=0):
+        self.width = width
+        self.height = height
+        self.module = module
+        self.skew = skew
+        self.blur = blur
+        self.noise = noise
+        self.occlusion = occlusion
+        self.rng = np.random.default_rng(seed)
+
+    def _background(self):
+        #cardboard brown with some low frequency blotches
+        base = np.array([70, 120, 165], dtype=np.float32)  #bgr
+        small = self.rng.normal(0, 12, (self.height // 40 + 1, self.width // 40 + 1)).astype(np.float32)
+        blotch = np.asarray(Image.fromarray(small, "F").resize((self.width, self.height), Image.BILINEAR))
+        return np.clip(base + blotch[:, :, None], 0, 255).astype(np.uint8)
+
+    def render(self, codes, offset=(0, 0)):
+        #(bgr frame, truth list), offset shifts the whole pallet (it moving past the camera)
+        img = Image.fromarray(self._background()[:, :, ::-1])
+        n = max(1, len(codes))
+        cols = int(np.ceil(np.sqrt(n * self.width / self.height)))
+        rows = int(np.ceil(n / cols))
+        cell_w, cell_h = self.width // cols, self.height // rows
+        truth = []
+
+        for k, code in enumerate(codes):
+            label = render_label(code, self.module)
+            angle = float(self.rng.uniform(-self.skew, self.skew)) if self.skew else 0.0
+            mask = Image.new("L", label.size, 255)
+            if angle:
+                label = label.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+                mask = mask.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=0)
+
+            r, c = divmod(k, cols)
+            slack_x = max(0, cell_w - label.width)
+            slack_y = max(0, cell_h - label.height)
+            x = c * cell_w + int(self.rng.integers(0, slack_x + 1)) + offset[0]
+            y = r * cell_h + int(self.rng.integers(0, slack_y + 1)) + offset[1]
+            img.paste(label.convert("RGB"), (x, y), mask)
+            box = [max(0, x), max(0, y), min(self.width, x + label.width), min(self.height, y + label.height)]
+
+            covered = 0.0
+            if self.occlusion and self.rng.random() < self.occlusion:
+                #cover a band across the bars, up to 40% of the label width
+                covered = float(self.rng.uniform(0.1, 0.4))
+                band = int(label.width * covered)
+                ox = x + int(self.rng.integers(0, max(1, label.width - band)))
+                shade = tuple(int(v) for v in self.rng.integers(30, 200, 3))
+                ImageDraw.Draw(img).rectangle([ox, y - 5, ox + band, y + label.height + 5], fill=shade)
+
+            if box[2] > box[0] and box[3] > box[1]:
+                truth.append({"code": code, "box": box, "angle": round(angle, 2), "module": self.module,
+                              "occluded": round(covered, 2)})
+
+        if self.blur:
+            img = img.filter(ImageFilter.GaussianBlur(self.blur))
+        frame = np.asarray(img)[:, :, ::-1]
+        if self.noise:
+            frame = np.clip(frame + self.rng.normal(0, self.noise, frame.shape), 0, 255).astype(np.uint8)
+        return np.ascontiguousarray(frame), truth
+
+def pallet_frames(codes, per_frame=6, hold=5, drift=12, **scene_kw):
+    #(frame, truth) pairs, each group of per_frame codes stays in view for
+    #hold frames drifting a few px per frame like a pallet on a forklift
+    scene = PalletScene(**scene_kw)
+    for start in range(0, len(codes), per_frame):
+        group = codes[start:start + per_frame]
+        seed = int(scene.rng.integers(1 << 31))
+        for h in range(hold):
+            #same layout for the whole hold, only the offset moves
+            scene.rng = np.random.default_rng(seed)
+            yield scene.render(group, (h * drift, h * drift // 3))
+
+def sscc_codes(n, prefix="0061414", seed=0):
+    #n distinct 18 digit sscc style codes with a valid check digit
+    from manifestIndex import gs1_check_ok
+    out = []
+    for serial in range(seed, seed + n):
+        body = f"{prefix}{serial:0{17 - len(prefix)}d}"
+        for d in "0123456789":
+            if gs1_check_ok(body + d):
+                out.append(body + d)
+                break
+    return out
+
+def write_dataset(out_dir, frames, manifest_codes=None):
+    #frame_00000.png + frame_00000.json for every frame, plus manifest.txt
+    os.makedirs(out_dir, exist_ok=True)
+    n = 0
+    for i, (frame, truth) in enumerate(frames):
+        name = os.path.join(out_dir, f"frame_{i:05d}")
+        Image.fromarray(frame[:, :, ::-1]).save(name + ".png")
+        with open(name + ".json", "w") as f:
+            json.dump({"frame": i, "labels": truth}, f)
+        n += 1
+    if manifest_codes is not None:
+        with open(os.path.join(out_dir, "manifest.txt"), "w") as f:
+            f.write("\n".join(manifest_codes) + "\n")
+    return n
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="render synthetic pallet frames with ground truth")
+    ap.add_argument("out")
+    ap.add_argument("--manifest", help="codes to render, default is --codes generated sscc codes")
+    ap.add_argument("--codes", type=int, default=30)
+    ap.add_argument("--per-frame", type=int, default=6)
+    ap.add_argument("--hold", type=int, default=5, help="frames each group of labels stays in view")
+    ap.add_argument("--frames", type=int, default=None, help="cap on frames written")
+    ap.add_argument("--width", type=int, default=1920)
+    ap.add_argument("--height", type=int, default=1080)
+    ap.add_argument("--module", type=int, default=2, help="narrow bar width in px")
+    ap.add_argument("--skew", type=float, default=0.0)
+    ap.add_argument("--blur", type=float, default=0.0)
+    ap.add_argument("--noise", type=float, default=0.0)
+    ap.add_argument("--occlusion", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    if args.manifest:
+        from manifestIndex import iter_manifest
+        codes = [c for c, _ in iter_manifest(args.manifest)]
+    else:
+        codes = sscc_codes(args.codes, seed=args.seed)
+
+    frames = pallet_frames(
+        codes, args.per_frame, args.hold,
+        width=args.width, height=args.height, module=args.module, skew=args.skew,
+        blur=args.blur, noise=args.noise, occlusion=args.occlusion, seed=args.seed,
+    )
+    if args.frames:
+        frames = (f for f, _ in zip(frames, range(args.frames)))
+    n = write_dataset(args.out, frames, codes)
+    print(f"{n} frames, {len(codes)} codes -> {args.out}")
+
+if __name__ == "__main__":
+    sys.exit(main())